@@ -0,0 +1,431 @@
+"""Headless benchmarks for the hot paths of the engine (hypercard_engine.py).
+
+    python benchmarks/bench.py                       # all benchmarks, all sizes
+    python benchmarks/bench.py --sizes 10,1000 -k nav
+    python benchmarks/bench.py --out new.json --compare old.json
+
+Each benchmark runs against a synthetic stack of the given size (cards and
+parts). Results are written as JSON; --compare prints the ratio against an
+earlier run and exits non-zero when something got slower than --threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import hypercard_engine as hc  # noqa: E402
+
+DEFAULT_SIZES = (10, 1_000, 100_000)
+PARTS_PER_CARD = 5
+BG_PARTS = 20           # background parts in the render_bg stack
+DENSE_PARTS = 10_000    # parts on the one card of the spatial stack
+RESULT_ROWS = 100_000   # rows in the user table the sql benchmarks read
+
+HANDLER_SCRIPT = """on click
+get field "f0" into "a"
+set field "f1" to "{a}"
+get field "f2" into "b"
+set field "f3" to "x"
+end click"""
+
+
+# ---------------- synthetic stacks ----------------
+
+def make_stack(conn: sqlite3.Connection, cards: int, parts: int, bg_parts: int = 0):
+    """one stack, one background with `bg_parts` parts, `cards` cards and `parts` parts spread over them"""
+    hc.init_db(conn)
+    with conn:
+        conn.execute("DELETE FROM part")
+        conn.execute("DELETE FROM card")
+        conn.executemany(
+            "INSERT INTO card (id, stack_id, background_id, name, order_index, script) VALUES (?, 1, 1, ?, ?, ?)",
+            ((i, f"Card {i}", i, HANDLER_SCRIPT) for i in range(1, cards + 1)),
+        )
+        conn.executemany(
+            f"INSERT INTO part ({hc.PART_COLUMNS}) VALUES (?, ?, NULL, ?, ?, ?, ?, 100, 30, ?, 0, ?, ?)",
+            (
+                (i, i % cards + 1, "field" if i % 2 else "button", f"f{i // cards % PARTS_PER_CARD}",
+                 i % 400, i % 300, f"text {i}", '{"style": "plain"}', "")
+                for i in range(parts)
+            ),
+        )
+        conn.executemany(
+            f"INSERT INTO part ({hc.PART_COLUMNS}) VALUES (?, NULL, 1, ?, ?, ?, ?, 100, 30, ?, 0, ?, ?)",
+            (
+                (parts + i, "field" if i % 2 else "button", f"bg{i}", i % 8 * 100, i // 8 * 40, f"bg text {i}",
+                 '{"style": "plain"}', "")
+                for i in range(bg_parts)
+            ),
+        )
+
+
+def make_script(handlers: int) -> str:
+    out = []
+    for h in range(handlers):
+        out.append(f"on event{h}")
+        out.append('get field "Name" into "n"')
+        out.append('set field "Notes" to "Hello {n}"')
+        out.append('sql "INSERT INTO t(a, b) VALUES(\'{n}\', {h})"')
+        out.append('answer "Saved {n}"')
+        out.append("go next card")
+        out.append(f"end event{h}")
+    return "\n".join(out)
+
+
+class BenchApi(hc.AppApi):
+    """the script API without output: field access goes to the model"""
+
+    def __init__(self, model: hc.StackModel, card_id: int):
+        self.model = model
+        self.card_id = card_id
+        self.runtime = None
+
+    def go_next_card(self):
+        self.card_id = self.model.next_card_id(self.card_id)
+
+    def go_prev_card(self):
+        self.card_id = self.model.prev_card_id(self.card_id)
+
+    def go_card_by_name(self, name):
+        self.card_id = self.model.card_id_by_name(name) or self.card_id
+
+    def go_card_by_number(self, number):
+        self.card_id = self.model.card_id_by_number(number) or self.card_id
+
+    def answer(self, text):
+        pass
+
+    def set_field(self, name, value):
+        p = self.model.find_part(self.model.card(self.card_id), "field", name)
+        if p is not None:
+            self.model.set_part_props(p, text=value)
+
+    def get_field(self, name, var):
+        p = self.model.find_part(self.model.card(self.card_id), "field", name)
+        self.runtime.vars[var] = (p.text or "") if p is not None else ""
+
+    def run_user_sql(self, query, into, params=(), many=None):
+        pass
+
+    def chain_finished(self):
+        pass
+
+
+# ---------------- benchmarks ----------------
+# each takes (env, size) and returns (callable, ops per call)
+
+def bench_parse(env, size):
+    text = make_script(max(1, size // 100))
+    return (lambda: hc.compile_script(hc.parse_script(text))), 1
+
+
+def bench_script_cache(env, size):
+    cache = hc.ScriptCache()
+    texts = [make_script(1) + f"\n-- {i}" for i in range(min(size, 512))]
+    for t in texts:
+        cache.get(t)
+    return (lambda: [cache.get(t) for t in texts]), len(texts)
+
+
+def bench_exec(env, size):
+    model = env["model"]
+    api = BenchApi(model, model.first_card_id())
+    rt = hc.ScriptRuntime(api)
+    api.runtime = rt
+    cards = model.card_ids()[:100]
+
+    def run():
+        for cid in cards:
+            api.card_id = cid
+            rt.run_event_chain("click", [HANDLER_SCRIPT])
+    return run, len(cards)
+
+
+def bench_render(env, size):
+    # what render_current_card builds and sends to the page on a snapshot miss
+    model = env["model"]
+    cache = hc.CardSnapshotCache(model)
+    ids = model.card_ids()[:100]
+
+    def run():
+        for cid in ids:
+            cache.invalidate_card(cid)
+            snap = cache.get(cid)
+            json.dumps({"op": "card", "cardId": cid, "mode": "browse", "card": {"parts": snap.view}})
+    return run, len(ids)
+
+
+def bench_render_bg(env, size):
+    # as render, on a templated stack: BG_PARTS shared background parts per card
+    if "bg_model" not in env:
+        conn = sqlite3.connect(":memory:")
+        make_stack(conn, min(size, 1_000), min(size, 1_000) * PARTS_PER_CARD, BG_PARTS)
+        env["bg_model"] = hc.StackModel(conn)
+    model = env["bg_model"]
+    cache = hc.CardSnapshotCache(model)
+    ids = model.card_ids()[:100]
+
+    def run():
+        for cid in ids:
+            cache.invalidate_card(cid)
+            snap = cache.get(cid)
+            json.dumps({"op": "card", "cardId": cid, "mode": "browse", "card": {"parts": snap.view}})
+    return run, len(ids)
+
+
+def bench_snapshot(env, size):
+    model = env["model"]
+    cache = hc.CardSnapshotCache(model)
+    ids = model.card_ids()[:100]
+
+    def run():
+        for cid in ids:
+            cache.invalidate_card(cid)
+            cache.get(cid)
+    return run, len(ids)
+
+
+def bench_nav(env, size):
+    model = env["model"]
+    steps = min(size, 10_000)
+
+    def run():
+        cid = model.first_card_id()
+        for _ in range(steps):
+            cid = model.next_card_id(cid)
+        for _ in range(steps):
+            cid = model.prev_card_id(cid)
+        model.card_id_by_name(f"Card {size}")
+        model.card_id_by_number(size // 2 or 1)
+    return run, 2 * steps
+
+
+def bench_parts_cold(env, size):
+    # layer loads straight from the DB: 100 cards cycle through an 8 layer LRU
+    model = hc.StackModel(env["conn"], max_layers=8)
+    cards = [model.card(cid) for cid in model.card_ids()[:100]]
+
+    def run():
+        for card in cards:
+            model.parts_for_card(card)
+    return run, len(cards)
+
+
+def bench_field_lookup(env, size):
+    model = env["model"]
+    cards = [model.card(cid) for cid in model.card_ids()[:100]]
+
+    def run():
+        for card in cards:
+            for i in range(PARTS_PER_CARD):
+                model.find_part(card, "field", f"f{i}")
+    return run, len(cards) * PARTS_PER_CARD
+
+
+def bench_spatial(env, size):
+    # edit mode on a dense card: marquee, snap probe and a move per op
+    if "dense_model" not in env:
+        conn = sqlite3.connect(":memory:")
+        make_stack(conn, 1, 0)
+        side = int(DENSE_PARTS ** 0.5)
+        with conn:
+            conn.executemany(
+                f"INSERT INTO part ({hc.PART_COLUMNS}) VALUES (?, 1, NULL, 'button', ?, ?, ?, 18, 18, '', 0, '{{}}', '')",
+                ((i, f"s{i}", i % side * 22, i // side * 22) for i in range(DENSE_PARTS)),
+            )
+        env["dense_model"] = hc.StackModel(conn)
+    model = env["dense_model"]
+    card = model.card(model.first_card_id())
+    part = model.part(DENSE_PARTS // 2)
+    steps = 100
+
+    def run():
+        for i in range(steps):
+            x, y = i * 17 % 2000, i * 13 % 2000
+            model.parts_in_rect(card, (x, y, x + 200, y + 200))
+            model.snap_rect(card, (x + 3, y + 5, x + 21, y + 23), {part.id})
+            model.set_part_props(part, x=x, y=y)
+    return run, steps
+
+
+def bench_flush(env, size):
+    model = env["model"]
+    cards = [model.card(cid) for cid in model.card_ids()[:100]]
+    parts = [p for card in cards for p in model.parts_for_card(card)]
+
+    def run():
+        for i, p in enumerate(parts):
+            model.set_part_props(p, x=i, y=i)
+        model.flush()
+    return run, len(parts)
+
+
+def bench_sql(env, size):
+    conn = env["user_conn"]
+    rows = min(size, RESULT_ROWS)
+
+    def run():
+        job = hc.SqlJob("SELECT a, b FROM t WHERE b < ?", None, (rows,))
+        result = hc.ResultCursor(conn, conn.execute(job.query, job.params), job.query, job.params)
+        while not result.exhausted:
+            result.fetch(hc.RESULT_CHUNK_ROWS)
+        job = hc.SqlJob("SELECT count(*) FROM t WHERE b < ?", "n", (rows,))
+        hc.execute_user_sql(conn, job)
+    return run, rows
+
+
+def bench_sql_export(env, size):
+    conn = env["user_conn"]
+    rows = min(size, RESULT_ROWS)
+    path = os.path.join(env["tmp"], "export.jsonl")
+
+    def run():
+        job = hc.SqlJob("SELECT a, b FROM t WHERE b < ?", None, (rows,))
+        job.export = (path, "jsonl")
+        hc.export_rows(conn, job)
+    return run, rows
+
+
+def bench_stack_io(env, size):
+    path = os.path.join(env["tmp"], "stack.jsonl")
+    target = sqlite3.connect(":memory:")
+    hc.init_db(target)
+
+    def run():
+        hc.export_stack(env["conn"], path)
+        hc.import_stack(target, path)
+    return run, env["parts"]
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "script_cache": bench_script_cache,
+    "exec": bench_exec,
+    "render": bench_render,
+    "render_bg": bench_render_bg,
+    "snapshot": bench_snapshot,
+    "nav": bench_nav,
+    "parts_cold": bench_parts_cold,
+    "field_lookup": bench_field_lookup,
+    "spatial": bench_spatial,
+    "flush": bench_flush,
+    "sql": bench_sql,
+    "sql_export": bench_sql_export,
+    "stack_io": bench_stack_io,
+}
+
+
+# ---------------- runner ----------------
+
+def make_env(size: int, tmp: str) -> dict:
+    conn = sqlite3.connect(":memory:")
+    parts = size * PARTS_PER_CARD
+    make_stack(conn, size, parts)
+    user_conn = sqlite3.connect(os.path.join(tmp, f"user_{size}.db"))
+    with user_conn:
+        user_conn.execute("CREATE TABLE IF NOT EXISTS t(a TEXT, b INTEGER)")
+        user_conn.execute("CREATE INDEX IF NOT EXISTS t_b ON t(b)")
+        if user_conn.execute("SELECT count(*) FROM t").fetchone()[0] == 0:
+            user_conn.executemany("INSERT INTO t VALUES (?, ?)", ((f"row {i}", i) for i in range(RESULT_ROWS)))
+    return {"conn": conn, "model": hc.StackModel(conn), "user_conn": user_conn, "parts": parts, "tmp": tmp}
+
+
+def measure(fn, repeat: int, min_time: float) -> list[float]:
+    """seconds per call; each sample runs fn enough times to last min_time"""
+    fn()  # warm up
+    loops = 1
+    while True:
+        t = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - t
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        t = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - t) / loops)
+    return samples
+
+
+def run(sizes, names, repeat: int, min_time: float) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            env = make_env(size, tmp)
+            for name in names:
+                fn, ops = BENCHMARKS[name](env, size)
+                samples = measure(fn, repeat, min_time)
+                best = min(samples)
+                results.append({
+                    "name": name,
+                    "size": size,
+                    "ops": ops,
+                    "best_s": best,
+                    "mean_s": sum(samples) / len(samples),
+                    "us_per_op": best / ops * 1e6,
+                })
+                print(f"{name:>14} {size:>8}  {best * 1e3:10.3f} ms  {best / ops * 1e6:10.3f} us/op", flush=True)
+            env["conn"].close()
+            env["user_conn"].close()
+    return results
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float) -> bool:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+    ok = True
+    print(f"\ncompared to {baseline_path}:")
+    for r in results:
+        old = baseline.get((r["name"], r["size"]))
+        if old is None:
+            continue
+        ratio = r["us_per_op"] / old["us_per_op"]
+        flag = "  SLOWER" if ratio > threshold else ""
+        ok = ok and not flag
+        print(f"{r['name']:>14} {r['size']:>8}  x{ratio:6.2f}{flag}")
+    return ok
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma separated card counts")
+    ap.add_argument("-k", dest="filter", default="", help="only benchmarks whose name contains this")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--min-time", type=float, default=0.2, help="seconds per sample")
+    ap.add_argument("--out", help="write results as JSON here")
+    ap.add_argument("--compare", help="earlier --out file to compare against")
+    ap.add_argument("--threshold", type=float, default=1.2, help="ratio counted as a regression")
+    args = ap.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    names = [n for n in BENCHMARKS if args.filter in n]
+    results = run(sizes, names, args.repeat, args.min_time)
+
+    report = {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    if args.compare and not compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2342 @@
+"""HyperCard Lite engine: stack model, script engine and user SQL, no Qt.
+
+hypercard_gui builds the window on top of this; `python hypercard.py run`
+uses it alone (see cli_main) so batch jobs never load Qt.
+"""
+
+import re
+import sys
+import csv
+import json
+import time
+import sqlite3
+import hashlib
+import os
+import argparse
+import threading
+import zlib
+import functools
+from contextlib import nullcontext
+from urllib.request import pathname2url
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# -------------------------------------------------
+# DB / MODEL (runtime DB)
+# -------------------------------------------------
+
+DB_PATH = ":memory:"  # change to "stack.db" for persistence (see RuntimeDb)
+
+FLUSH_IDLE_MS = 300         # write pending edits once input pauses this long
+FLUSH_MAX_DELAY_MS = 2000   # ...but never hold an edit back longer than this
+MAX_OPEN_CARD_CHAINS = 100  # openCard handlers run per user action; stops go loops
+BACKUP_INTERVAL_S = 2.0     # how often the backup thread looks for new commits
+BACKUP_STEP_PAGES = 256     # pages copied per backup step; writers get in between steps
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS stack (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    start_card_id INTEGER,
+    created_at TEXT,
+    updated_at TEXT,
+    script TEXT
+);
+
+CREATE TABLE IF NOT EXISTS background (
+    id INTEGER PRIMARY KEY,
+    stack_id INTEGER NOT NULL,
+    name TEXT,
+    script TEXT,
+    layout_json TEXT,
+    FOREIGN KEY (stack_id) REFERENCES stack(id)
+);
+
+CREATE TABLE IF NOT EXISTS card (
+    id INTEGER PRIMARY KEY,
+    stack_id INTEGER NOT NULL,
+    background_id INTEGER,
+    name TEXT,
+    order_index INTEGER,
+    script TEXT,
+    FOREIGN KEY (stack_id) REFERENCES stack(id),
+    FOREIGN KEY (background_id) REFERENCES background(id)
+);
+
+CREATE TABLE IF NOT EXISTS part (
+    id INTEGER PRIMARY KEY,
+    card_id INTEGER,
+    background_id INTEGER,
+    type TEXT NOT NULL,
+    name TEXT,
+    props_json TEXT,
+    script TEXT,
+    FOREIGN KEY (card_id) REFERENCES card(id),
+    FOREIGN KEY (background_id) REFERENCES background(id)
+);
+"""
+
+# (version, sql) pairs applied in order by migrate_db; the version
+# reached is kept in PRAGMA user_version. Append, never edit.
+SCHEMA_MIGRATIONS = [
+    (1, """
+CREATE INDEX IF NOT EXISTS idx_card_stack_order ON card(stack_id, order_index);
+CREATE INDEX IF NOT EXISTS idx_card_name ON card(name);
+CREATE INDEX IF NOT EXISTS idx_part_card ON part(card_id);
+CREATE INDEX IF NOT EXISTS idx_part_background ON part(background_id);
+"""),
+    # geometry, text and lockText get their own columns; props_json keeps the rest
+    (2, """
+ALTER TABLE part ADD COLUMN x INTEGER;
+ALTER TABLE part ADD COLUMN y INTEGER;
+ALTER TABLE part ADD COLUMN width INTEGER;
+ALTER TABLE part ADD COLUMN height INTEGER;
+ALTER TABLE part ADD COLUMN text TEXT;
+ALTER TABLE part ADD COLUMN lock_text INTEGER;
+UPDATE part SET
+    x = json_extract(props_json, '$.x'),
+    y = json_extract(props_json, '$.y'),
+    width = json_extract(props_json, '$.width'),
+    height = json_extract(props_json, '$.height'),
+    text = json_extract(props_json, '$.text'),
+    lock_text = json_extract(props_json, '$.lockText'),
+    props_json = json_remove(props_json, '$.x', '$.y', '$.width', '$.height', '$.text', '$.lockText')
+WHERE json_valid(props_json);
+"""),
+    # full-text index over part text, name and script; triggers keep it in
+    # step with every write to part (flush, import, card delete)
+    (3, """
+CREATE VIRTUAL TABLE part_fts USING fts5(text, name, script, content='part', content_rowid='id');
+CREATE TRIGGER part_fts_insert AFTER INSERT ON part BEGIN
+    INSERT INTO part_fts(rowid, text, name, script) VALUES (new.id, new.text, new.name, new.script);
+END;
+CREATE TRIGGER part_fts_delete AFTER DELETE ON part BEGIN
+    INSERT INTO part_fts(part_fts, rowid, text, name, script) VALUES ('delete', old.id, old.text, old.name, old.script);
+END;
+CREATE TRIGGER part_fts_update AFTER UPDATE OF text, name, script ON part BEGIN
+    INSERT INTO part_fts(part_fts, rowid, text, name, script) VALUES ('delete', old.id, old.text, old.name, old.script);
+    INSERT INTO part_fts(rowid, text, name, script) VALUES (new.id, new.text, new.name, new.script);
+END;
+INSERT INTO part_fts(part_fts) VALUES ('rebuild');
+"""),
+]
+
+
+def migrate_db(conn: sqlite3.Connection):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, sql in SCHEMA_MIGRATIONS:
+        if target > version:
+            conn.executescript(f"BEGIN;\n{sql}\nPRAGMA user_version = {target};\nCOMMIT;")
+            version = target
+
+
+def tune_db(conn: sqlite3.Connection):
+    """WAL + synchronous=NORMAL for file-backed stacks: commits stop waiting on an fsync each"""
+    files = [row[2] for row in conn.execute("PRAGMA database_list")]
+    if files and files[0]:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+
+
+def init_db(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA_SQL)
+    migrate_db(conn)
+    cur = conn.execute("SELECT COUNT(*) FROM stack")
+    if cur.fetchone()[0] == 0:
+        conn.execute("INSERT INTO stack (id, name, start_card_id, script) VALUES (1, 'Untitled', 1, '')")
+        conn.execute("INSERT INTO background (id, stack_id, name, script, layout_json) VALUES (1, 1, 'Default BG', '', '{}')")
+        conn.execute("INSERT INTO card (id, stack_id, background_id, name, order_index, script) VALUES (1, 1, 1, 'Card 1', 1, '')")
+        conn.execute("INSERT INTO card (id, stack_id, background_id, name, order_index, script) VALUES (2, 1, 1, 'Card 2', 2, '')")
+        # button
+        btn_script = """on click
+go next card
+end click"""
+        conn.execute(
+            "INSERT INTO part (card_id, type, name, x, y, width, height, text, props_json, script) "
+            "VALUES (1, 'button', 'NextButton', 20, 20, 100, 30, 'Next', '{}', ?)",
+            (btn_script,)
+        )
+        # field
+        conn.execute(
+            "INSERT INTO part (card_id, type, name, x, y, width, height, text, lock_text, props_json, script) "
+            "VALUES (1, 'field', 'Notes', 20, 70, 250, 120, 'Hello from card 1', 0, '{}', '')"
+        )
+        conn.commit()
+
+
+class RuntimeDb:
+    """the runtime DB, kept in memory with separate writer and reader connections
+
+    Both connections share one in-memory database (shared cache). The
+    reader uses read_uncommitted so loading parts never waits on a table
+    lock held by a write. When path is a file it is loaded at start and a
+    BackupThread copies the database back to it after commits.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.uri = f"file:hypercard-runtime-{os.getpid()}-{id(self)}?mode=memory&cache=shared"
+        self.path = None if path == ":memory:" else path
+        self.writer = sqlite3.connect(self.uri, uri=True)
+        if self.path and os.path.exists(self.path):
+            src = sqlite3.connect(self.path)
+            try:
+                src.backup(self.writer)
+            finally:
+                src.close()
+        init_db(self.writer)
+        self.reader = sqlite3.connect(self.uri, uri=True)
+        self.reader.execute("PRAGMA read_uncommitted = 1")
+        self.backup = None
+        if self.path:
+            self.backup = BackupThread(self.uri, self.path)
+            self.backup.start()
+
+    def changed(self):
+        """call after a commit on the writer"""
+        if self.backup is not None:
+            self.backup.changed()
+
+    def close(self):
+        # the last backup runs before the connections (and the memory DB) go away
+        if self.backup is not None:
+            self.backup.stop()
+        self.reader.close()
+        self.writer.close()
+
+
+class BackupThread(threading.Thread):
+    """copies the in-memory runtime DB to a file with the online backup API
+
+    A round copies BACKUP_STEP_PAGES pages per step into path + ".tmp" and
+    renames it over path, so the file is always a complete stack. Commits
+    made during a round are carried into it by SQLite.
+    """
+
+    def __init__(self, uri: str, path: str, interval: float = BACKUP_INTERVAL_S):
+        super().__init__(name="stack backup", daemon=True)
+        self.uri = uri
+        self.path = path
+        self.interval = interval
+        self.generation = 0   # bumped by changed()
+        self.saved = 0        # generation the file on disk has
+        self.stopping = False
+        self.wake = threading.Event()
+        self.error = None
+
+    def changed(self):
+        self.generation += 1
+
+    def stop(self):
+        self.stopping = True
+        self.wake.set()
+        self.join()
+
+    def run(self):
+        src = sqlite3.connect(self.uri, uri=True)
+        try:
+            while True:
+                self.wake.wait(self.interval)
+                self.wake.clear()
+                generation = self.generation
+                if generation != self.saved:
+                    try:
+                        self.backup(src)
+                        self.saved, self.error = generation, None
+                    except (OSError, sqlite3.Error) as e:
+                        self.error = e
+                        print(f"stack backup to {self.path} failed: {e}", file=sys.stderr)
+                if self.stopping:
+                    break
+        finally:
+            src.close()
+
+    def backup(self, src: sqlite3.Connection):
+        tmp = self.path + ".tmp"
+        with TRACER.span("db", "backup"):
+            dst = sqlite3.connect(tmp)
+            try:
+                src.backup(dst, pages=BACKUP_STEP_PAGES, sleep=0.001)
+            finally:
+                dst.close()
+            os.replace(tmp, self.path)
+
+
+# -------------------------------------------------
+# TRACING
+# -------------------------------------------------
+# Spans are only recorded while TRACER.enabled is set; when it is off a
+# span is a shared nullcontext and the statement loop takes its plain path.
+
+TRACE_MAX_EVENTS = 200_000  # newest events kept for export
+TRACE_BUCKETS = 16          # duration histogram: <2us, <4us, ... doubling
+
+
+class Span:
+    __slots__ = ("tracer", "cat", "name", "args", "start")
+
+    def __init__(self, tracer, cat, name, args):
+        self.tracer = tracer
+        self.cat = cat
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.cat, self.name, self.start, time.perf_counter() - self.start, self.args)
+        return False
+
+
+NULL_SPAN = nullcontext()
+
+
+class Tracer:
+    """complete events in Chrome trace-event form, plus per-name stats"""
+
+    def __init__(self, max_events: int = TRACE_MAX_EVENTS):
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.events = deque(maxlen=max_events)
+        self.stats = {}    # (cat, name) -> [count, total s, max s, bucket counts]
+        self.threads = {}  # tid -> thread name
+        self.lock = threading.Lock()
+
+    def span(self, cat: str, name: str, args: dict | None = None):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, cat, name, args)
+
+    def record(self, cat: str, name: str, start: float, dur: float, args: dict | None = None):
+        tid = threading.get_ident()
+        bucket = min(TRACE_BUCKETS - 1, int(dur * 1e6).bit_length() - 1) if dur >= 2e-6 else 0
+        with self.lock:
+            if tid not in self.threads:
+                self.threads[tid] = threading.current_thread().name
+            self.events.append((cat, name, start, dur, tid, args))
+            st = self.stats.get((cat, name))
+            if st is None:
+                st = self.stats[(cat, name)] = [0, 0.0, 0.0, [0] * TRACE_BUCKETS]
+            st[0] += 1
+            st[1] += dur
+            if dur > st[2]:
+                st[2] = dur
+            st[3][bucket] += 1
+
+    def clear(self):
+        with self.lock:
+            self.events.clear()
+            self.stats.clear()
+
+    def snapshot_stats(self) -> dict:
+        with self.lock:
+            return {k: [c, t, m, list(b)] for k, (c, t, m, b) in self.stats.items()}
+
+    def chrome_trace(self) -> dict:
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        out = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        for cat, name, start, dur, tid, args in events:
+            ev = {
+                "name": name, "cat": cat, "ph": "X", "pid": 1, "tid": tid,
+                "ts": (start - self.origin) * 1e6, "dur": dur * 1e6,
+            }
+            if args:
+                ev["args"] = args
+            out.append(ev)
+        return {"traceEvents": out, "displayTimeUnit": "ms"}
+
+    def export(self, path: str) -> int:
+        trace = self.chrome_trace()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f)
+        return len(trace["traceEvents"])
+
+
+TRACER = Tracer()
+
+
+def traced(cat: str, name: str | None = None):
+    """decorator: record each call as a span"""
+    def wrap(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            with Span(TRACER, cat, label, None):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+# -------------------------------------------------
+# STACK MODEL (in-memory, write-behind)
+# -------------------------------------------------
+# Reads are served from typed objects; mutations change the objects and
+# mark them dirty, and flush() writes everything pending to the
+# SCHEMA_SQL tables in one transaction. Stack, backgrounds and cards are
+# loaded up front; parts are loaded per card/background layer and only
+# a bounded number of layers stays in memory.
+
+class Stack:
+    __slots__ = ("id", "name", "start_card_id", "script")
+
+    def __init__(self, id, name, start_card_id, script):
+        self.id = id
+        self.name = name
+        self.start_card_id = start_card_id
+        self.script = script
+
+
+class Background:
+    __slots__ = ("id", "stack_id", "name", "script", "layout_json")
+
+    def __init__(self, id, stack_id, name, script, layout_json):
+        self.id = id
+        self.stack_id = stack_id
+        self.name = name
+        self.script = script
+        self.layout_json = layout_json
+
+
+class Card:
+    __slots__ = ("id", "stack_id", "background_id", "name", "order_index", "script")
+
+    def __init__(self, id, stack_id, background_id, name, order_index, script):
+        self.id = id
+        self.stack_id = stack_id
+        self.background_id = background_id
+        self.name = name
+        self.order_index = order_index
+        self.script = script
+
+
+# part property -> part column; None in a column means the property is unset
+PROP_COLUMNS = {"x": "x", "y": "y", "width": "width", "height": "height", "text": "text", "lockText": "lock_text"}
+
+
+class Part:
+    """the PROP_COLUMNS properties are plain attributes; any other property
+    lives in extra, parsed from props_json the first time it is needed"""
+    __slots__ = ("id", "card_id", "background_id", "type", "name",
+                 "x", "y", "width", "height", "text", "lock_text", "_extra", "_extra_json", "script")
+
+    def __init__(self, id, card_id, background_id, type, name, props, script):
+        self.id = id
+        self.card_id = card_id
+        self.background_id = background_id
+        self.type = type
+        self.name = name
+        self.x = self.y = self.width = self.height = self.text = self.lock_text = None
+        self._extra = {}
+        self._extra_json = None
+        self.script = script
+        self.set_props(props)
+
+    @property
+    def extra(self) -> dict:
+        if self._extra_json is not None:
+            self._extra = json.loads(self._extra_json) if self._extra_json else {}
+            self._extra_json = None
+        return self._extra
+
+    def extra_to_json(self) -> str:
+        if self._extra_json is not None:
+            return self._extra_json
+        return json.dumps(self._extra)
+
+    @property
+    def props(self) -> dict:
+        """all properties as one (new) dict"""
+        props = dict(self.extra)
+        for key, col in PROP_COLUMNS.items():
+            value = getattr(self, col)
+            if value is not None:
+                props[key] = bool(value) if col == "lock_text" else value
+        return props
+
+    def set_props(self, props: dict) -> set:
+        """update properties; returns the part columns that changed"""
+        columns = set()
+        for key, value in props.items():
+            col = PROP_COLUMNS.get(key)
+            if col is None:
+                self.extra[key] = value
+                columns.add("props_json")
+            else:
+                setattr(self, col, value)
+                columns.add(col)
+        return columns
+
+    @property
+    def layer(self):
+        if self.card_id is not None:
+            return ("card", self.card_id)
+        return ("bg", self.background_id)
+
+
+PART_COLUMNS = "id, card_id, background_id, type, name, x, y, width, height, text, lock_text, props_json, script"
+
+
+class CardOrder:
+    """card ids kept sorted by order_index; every lookup is a bisect"""
+
+    def __init__(self, cards=()):
+        pairs = sorted((c.order_index, c.id) for c in cards)
+        self.keys = [k for k, _ in pairs]   # order_index, ascending
+        self.ids = [cid for _, cid in pairs]
+        self.key_of = {cid: k for k, cid in pairs}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def position(self, card_id: int) -> int | None:
+        k = self.key_of.get(card_id)
+        if k is None:
+            return None
+        i = bisect_left(self.keys, k)
+        while self.ids[i] != card_id:  # several cards may share an order_index
+            i += 1
+        return i
+
+    def insert(self, card_id: int, order_index: int):
+        i = bisect_right(self.keys, order_index)
+        self.keys.insert(i, order_index)
+        self.ids.insert(i, card_id)
+        self.key_of[card_id] = order_index
+
+    def remove(self, card_id: int):
+        i = self.position(card_id)
+        if i is None:
+            return
+        del self.keys[i]
+        del self.ids[i]
+        del self.key_of[card_id]
+
+    def next(self, card_id: int) -> int | None:
+        i = self.position(card_id)
+        if i is None or i + 1 >= len(self.ids):
+            return None
+        return self.ids[i + 1]
+
+    def prev(self, card_id: int) -> int | None:
+        i = self.position(card_id)
+        if not i:
+            return None
+        return self.ids[i - 1]
+
+    def at_index(self, order_index: int) -> int | None:
+        i = bisect_left(self.keys, order_index)
+        if i < len(self.keys) and self.keys[i] == order_index:
+            return self.ids[i]
+        return None
+
+    def first(self) -> int | None:
+        return self.ids[0] if self.ids else None
+
+    def last_index(self) -> int:
+        return self.keys[-1] if self.keys else 0
+
+
+GEOMETRY_COLUMNS = ("x", "y", "width", "height")
+GRID_CELL = 64        # px; side of a PartGrid cell
+SNAP_DISTANCE = 6     # px an edge or centre may be off and still snap
+SNAP_RANGE = 400      # px around a dragged rect searched for snap neighbours
+
+
+def part_rect(part: Part) -> tuple[int, int, int, int]:
+    """(x0, y0, x1, y1) with the defaults the page draws a part with"""
+    x = 0 if part.x is None else part.x
+    y = 0 if part.y is None else part.y
+    return (x, y,
+            x + (100 if part.width is None else part.width),
+            y + (30 if part.height is None else part.height))
+
+
+def rects_overlap(a, b) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class PartGrid:
+    """uniform grid over the rects of one layer's parts
+
+    A part is listed in every cell its rect touches, so rectangle
+    queries only look at the parts in the cells they cover.
+    """
+
+    def __init__(self, parts=(), cell: int = GRID_CELL):
+        self.cell = cell
+        self.cells = {}   # (cx, cy) -> {part id: Part}
+        self.rects = {}   # part id -> rect the part is listed under
+        for p in parts:
+            self.add(p)
+
+    def _cells(self, rect):
+        c = self.cell
+        x0, y0, x1, y1 = rect
+        for cx in range(x0 // c, max(x0, x1 - 1) // c + 1):
+            for cy in range(y0 // c, max(y0, y1 - 1) // c + 1):
+                yield cx, cy
+
+    def add(self, part: Part):
+        rect = self.rects[part.id] = part_rect(part)
+        for key in self._cells(rect):
+            self.cells.setdefault(key, {})[part.id] = part
+
+    def remove(self, part: Part):
+        rect = self.rects.pop(part.id, None)
+        if rect is None:
+            return
+        for key in self._cells(rect):
+            bucket = self.cells[key]
+            del bucket[part.id]
+            if not bucket:
+                del self.cells[key]
+
+    def update(self, part: Part):
+        if self.rects.get(part.id) != part_rect(part):
+            self.remove(part)
+            self.add(part)
+
+    def query(self, rect) -> list[Part]:
+        """parts whose rect overlaps rect, in id (stacking) order"""
+        found = {}
+        cells = self.cells
+        rects = self.rects
+        for key in self._cells(rect):
+            bucket = cells.get(key)
+            if bucket:
+                for pid, p in bucket.items():
+                    if pid not in found and rects_overlap(rects[pid], rect):
+                        found[pid] = p
+        return [found[pid] for pid in sorted(found)]
+
+
+def snap_offset(rect, others, distance: int = SNAP_DISTANCE):
+    """(dx, dy, guides) moving rect so a left/centre/right (top/middle/bottom)
+    line meets the nearest such line of one of the other rects within
+    distance; guides are the ("x" | "y", position) lines it snapped to"""
+    offset = [0, 0]
+    guides = []
+    for axis, (lo, hi) in enumerate(((0, 2), (1, 3))):
+        lines = sorted({v for o in others for v in (o[lo], (o[lo] + o[hi]) // 2, o[hi])})
+        best = None
+        for mine in (rect[lo], (rect[lo] + rect[hi]) // 2, rect[hi]):
+            i = bisect_left(lines, mine)
+            for line in lines[max(i - 1, 0):i + 1]:  # nearest below and at/above
+                d = line - mine
+                if abs(d) <= distance and (best is None or abs(d) < abs(best[0])):
+                    best = (d, line)
+        if best is not None:
+            offset[axis] = best[0]
+            guides.append(("xy"[axis], best[1]))
+    return offset[0], offset[1], guides
+
+
+def fts_phrase(text: str) -> str:
+    """text as one FTS5 phrase; the last word also matches as a prefix"""
+    return '"' + text.strip().replace('"', '""') + '"*'
+
+
+def part_from_row(row) -> Part:
+    pid, card_id, bg_id, ptype, name, x, y, width, height, text, lock_text, props_json, script = row
+    part = Part(pid, card_id, bg_id, ptype, name, {}, script or "")
+    part.x, part.y, part.width, part.height, part.text, part.lock_text = x, y, width, height, text, lock_text
+    part._extra_json = props_json or ""
+    return part
+
+
+def part_row(part: Part) -> tuple:
+    return (part.id, part.card_id, part.background_id, part.type, part.name,
+            part.x, part.y, part.width, part.height, part.text, part.lock_text,
+            part.extra_to_json(), part.script)
+
+
+class StackModel:
+    def __init__(self, conn, max_layers: int = 512, reader=None):
+        self.conn = conn               # writes (flush)
+        self.reader = reader or conn   # loads and lookups
+        self.max_layers = max_layers
+        self.stacks = {}
+        self.backgrounds = {}
+        self.cards = {}
+        self.order = CardOrder()
+        self.card_by_name = {}     # name -> [card ids with that name]
+        self.layers = OrderedDict()  # ("card"|"bg", owner id) -> [Part], LRU
+        self.parts = {}            # loaded parts by id
+        self.part_names = {}       # layer key -> {(type, name): Part}, built on first lookup
+        self.grids = {}            # layer key -> PartGrid, built on first spatial query
+        self.dirty_parts = {}      # id -> Part, kept alive until flushed
+        self.part_changes = {}     # id -> set of part columns to write
+        self.new_parts = set()
+        self.dirty_cards = set()
+        self.deleted_cards = set()
+        self.load()
+
+    # ---------------- loading ----------------
+    @traced("db", "load stack")
+    def load(self):
+        for row in self.reader.execute("SELECT id, name, start_card_id, script FROM stack"):
+            self.stacks[row[0]] = Stack(*row)
+        for row in self.reader.execute("SELECT id, stack_id, name, script, layout_json FROM background"):
+            self.backgrounds[row[0]] = Background(*row)
+        for row in self.reader.execute(
+            "SELECT id, stack_id, background_id, name, order_index, script FROM card ORDER BY order_index ASC"
+        ):
+            self.cards[row[0]] = Card(*row)
+        self.order = CardOrder(self.cards.values())
+        for card in self.cards.values():
+            self.card_by_name.setdefault(card.name, []).append(card.id)
+        self.card_id_seq = self.reader.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM card").fetchone()[0]
+        self.part_id_seq = self.reader.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM part").fetchone()[0]
+
+    def _layer(self, key) -> list:
+        layer = self.layers.get(key)
+        if layer is not None:
+            self.layers.move_to_end(key)
+            return layer
+        col = "card_id" if key[0] == "card" else "background_id"
+        with TRACER.span("db", "load layer", {"layer": f"{key[0]} {key[1]}"}):
+            rows = self.reader.execute(f"SELECT {PART_COLUMNS} FROM part WHERE {col} = ? ORDER BY id", (key[1],))
+            layer = [part_from_row(r) for r in rows]
+        for p in layer:
+            self.parts[p.id] = p
+        self.layers[key] = layer
+        self._evict()
+        return layer
+
+    def _evict(self):
+        # layers holding unflushed parts stay until the next flush
+        excess = len(self.layers) - self.max_layers
+        if excess <= 0:
+            return
+        for key in list(self.layers):
+            layer = self.layers[key]
+            if any(p.id in self.dirty_parts for p in layer):
+                continue
+            del self.layers[key]
+            self.part_names.pop(key, None)
+            self.grids.pop(key, None)
+            for p in layer:
+                self.parts.pop(p.id, None)
+            excess -= 1
+            if excess == 0:
+                break
+
+    # ---------------- reads ----------------
+    def card(self, card_id: int) -> Card | None:
+        return self.cards.get(card_id)
+
+    def background(self, bg_id: int) -> Background | None:
+        return self.backgrounds.get(bg_id)
+
+    def parts_for_card(self, card: Card) -> list[Part]:
+        return self._layer(("bg", card.background_id)) + self._layer(("card", card.id))
+
+    def part(self, part_id: int) -> Part | None:
+        p = self.parts.get(part_id)
+        if p is not None:
+            return p
+        with TRACER.span("db", "find part"):
+            row = self.reader.execute("SELECT card_id, background_id FROM part WHERE id = ?", (part_id,)).fetchone()
+        if not row:
+            return None
+        self._layer(("card", row[0]) if row[0] is not None else ("bg", row[1]))
+        return self.parts.get(part_id)
+
+    def _names(self, key) -> dict:
+        names = self.part_names.get(key)
+        if names is None:
+            names = {}
+            for p in self._layer(key):
+                names.setdefault((p.type, p.name), p)  # lowest id wins, as in a scan
+            self.part_names[key] = names
+        else:
+            self.layers.move_to_end(key)
+        return names
+
+    def _grid(self, key) -> PartGrid:
+        grid = self.grids.get(key)
+        if grid is None:
+            grid = self.grids[key] = PartGrid(self._layer(key))
+        else:
+            self.layers.move_to_end(key)
+        return grid
+
+    def _card_grids(self, card: Card) -> tuple:
+        # background first: card parts are drawn on top
+        return self._grid(("bg", card.background_id)), self._grid(("card", card.id))
+
+    def parts_in_rect(self, card: Card, rect) -> list[Part]:
+        """parts of the card and its background overlapping rect, bottom to top"""
+        return [p for grid in self._card_grids(card) for p in grid.query(rect)]
+
+    def overlapping_parts(self, card: Card, part: Part) -> list[Part]:
+        return [p for p in self.parts_in_rect(card, part_rect(part)) if p is not part]
+
+    def snap_rect(self, card: Card, rect, exclude=()) -> tuple[int, int, list]:
+        """snap_offset against the parts near rect, leaving out the ids in exclude"""
+        x0, y0, x1, y1 = rect
+        near = self.parts_in_rect(card, (x0 - SNAP_RANGE, y0 - SNAP_RANGE, x1 + SNAP_RANGE, y1 + SNAP_RANGE))
+        return snap_offset(rect, [part_rect(p) for p in near if p.id not in exclude])
+
+    def card_parts(self, card_id: int) -> list[Part]:
+        return self._layer(("card", card_id))
+
+    def background_parts(self, bg_id: int) -> list[Part]:
+        return self._layer(("bg", bg_id))
+
+    def find_part(self, card: Card, ptype: str, name: str) -> Part | None:
+        """part by type and name; background parts shadow card parts like in a linear scan"""
+        return (self._names(("bg", card.background_id)).get((ptype, name))
+                or self._names(("card", card.id)).get((ptype, name)))
+
+    def find_card(self, text: str, after_card_id: int | None, columns: str = "text") -> int | None:
+        """next card (wrapping) after after_card_id with a card part matching
+        text, searched in the given part_fts columns; reads flushed rows only"""
+        if not text.strip():
+            return None
+        query = "{%s} : %s" % (columns, fts_phrase(text))
+        after = self.cards[after_card_id].order_index if after_card_id in self.cards else None
+        sql = (
+            "SELECT c.id FROM part_fts JOIN part p ON p.id = part_fts.rowid JOIN card c ON c.id = p.card_id "
+            "WHERE part_fts MATCH ? {} ORDER BY c.order_index, c.id LIMIT 1"
+        )
+        with TRACER.span("db", "find card"):
+            row = None
+            if after is not None:
+                row = self.reader.execute(sql.format("AND c.order_index > ?"), (query, after)).fetchone()
+            if row is None:
+                row = self.reader.execute(sql.format(""), (query,)).fetchone()
+        return row[0] if row else None
+
+    def card_ids(self) -> list[int]:
+        return self.order.ids
+
+    def first_card_id(self) -> int | None:
+        return self.order.first()
+
+    def next_card_id(self, card_id: int) -> int:
+        nxt = self.order.next(card_id)
+        return card_id if nxt is None else nxt
+
+    def prev_card_id(self, card_id: int) -> int:
+        prev = self.order.prev(card_id)
+        return card_id if prev is None else prev
+
+    def card_id_by_name(self, name: str) -> int | None:
+        ids = self.card_by_name.get(name)
+        if not ids:
+            return None
+        if len(ids) == 1:
+            return ids[0]
+        return min(ids, key=self.order.position)  # first in stack order
+
+    def card_id_by_number(self, number: int) -> int | None:
+        return self.order.at_index(number)
+
+    # ---------------- mutations ----------------
+    def touch_part(self, part: Part, *columns: str):
+        # repeated edits to the same part/column collapse into one write
+        self.dirty_parts[part.id] = part
+        self.part_changes.setdefault(part.id, set()).update(columns)
+
+    def set_part_props(self, part: Part, **props):
+        # a drag only writes x and y, typing only text
+        columns = part.set_props(props)
+        self.touch_part(part, *columns)
+        if not columns.isdisjoint(GEOMETRY_COLUMNS):
+            self._regrid(part)
+
+    def _regrid(self, part: Part):
+        grid = self.grids.get(part.layer)
+        if grid is not None:
+            grid.update(part)
+
+    def update_part(self, part: Part, name: str, props: dict, script: str):
+        if name != part.name:
+            # a duplicate name may take over the old key; rebuild on next lookup
+            self.part_names.pop(part.layer, None)
+        part.name = name
+        for col in PROP_COLUMNS.values():
+            setattr(part, col, None)
+        part._extra, part._extra_json = {}, None
+        part.set_props(props)
+        part.script = script
+        self.touch_part(part, "name", "script", "props_json", *PROP_COLUMNS.values())
+        self._regrid(part)
+
+    def add_part(self, card_id: int, ptype: str, name: str, props: dict, script: str) -> Part:
+        layer = self._layer(("card", card_id))
+        part = Part(self.part_id_seq, card_id, None, ptype, name, props, script)
+        self.part_id_seq += 1
+        layer.append(part)
+        names = self.part_names.get(part.layer)
+        if names is not None:
+            names.setdefault((ptype, name), part)
+        grid = self.grids.get(part.layer)
+        if grid is not None:
+            grid.add(part)
+        self.parts[part.id] = part
+        self.dirty_parts[part.id] = part
+        self.new_parts.add(part.id)
+        return part
+
+    def add_card(self, stack_id: int, bg_id: int, script: str = "") -> Card:
+        order_index = self.order.last_index() + 1
+        card = Card(self.card_id_seq, stack_id, bg_id, f"Card {order_index}", order_index, script)
+        self.card_id_seq += 1
+        self.cards[card.id] = card
+        self.order.insert(card.id, order_index)
+        self.card_by_name.setdefault(card.name, []).append(card.id)
+        self.dirty_cards.add(card.id)
+        return card
+
+    def set_card_script(self, card: Card, script: str):
+        card.script = script
+        self.dirty_cards.add(card.id)
+
+    def delete_card(self, card_id: int):
+        card = self.cards.pop(card_id, None)
+        if card is None:
+            return
+        self.part_names.pop(("card", card_id), None)
+        self.grids.pop(("card", card_id), None)
+        for p in self.layers.pop(("card", card_id), []):
+            self.parts.pop(p.id, None)
+            self.dirty_parts.pop(p.id, None)
+            self.part_changes.pop(p.id, None)
+            self.new_parts.discard(p.id)
+        self.dirty_cards.discard(card_id)
+        self.deleted_cards.add(card_id)
+        self.order.remove(card_id)
+        ids = self.card_by_name.get(card.name, [])
+        ids.remove(card_id)
+        if not ids:
+            self.card_by_name.pop(card.name, None)
+
+    # ---------------- write-behind ----------------
+    def has_pending(self) -> bool:
+        return bool(self.dirty_parts or self.dirty_cards or self.deleted_cards)
+
+    @traced("db")
+    def flush(self) -> bool:
+        """write everything pending; False when there was nothing to write"""
+        if not self.has_pending():
+            return False
+        inserts = []
+        updates = {}  # column tuple -> rows
+        for pid, p in self.dirty_parts.items():
+            if pid in self.new_parts:
+                inserts.append(part_row(p))
+                continue
+            columns = tuple(sorted(self.part_changes.get(pid, ())))
+            if columns:
+                updates.setdefault(columns, []).append(
+                    tuple(p.extra_to_json() if c == "props_json" else getattr(p, c) for c in columns) + (pid,)
+                )
+        card_rows = []
+        for cid in self.dirty_cards:
+            c = self.cards.get(cid)
+            if c is not None:
+                card_rows.append((c.id, c.stack_id, c.background_id, c.name, c.order_index, c.script))
+        with self.conn:
+            if self.deleted_cards:
+                gone = [(cid,) for cid in self.deleted_cards]
+                self.conn.executemany("DELETE FROM part WHERE card_id = ?", gone)
+                self.conn.executemany("DELETE FROM card WHERE id = ?", gone)
+            self.conn.executemany(
+                "INSERT INTO card (id, stack_id, background_id, name, order_index, script) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET stack_id = excluded.stack_id, background_id = excluded.background_id, "
+                "name = excluded.name, order_index = excluded.order_index, script = excluded.script",
+                card_rows,
+            )
+            self.conn.executemany(f"INSERT INTO part ({PART_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", inserts)
+            for columns, rows in updates.items():
+                assignments = ", ".join(f"{c} = ?" for c in columns)
+                self.conn.executemany(f"UPDATE part SET {assignments} WHERE id = ?", rows)
+        self.dirty_parts.clear()
+        self.part_changes.clear()
+        self.new_parts.clear()
+        self.dirty_cards.clear()
+        self.deleted_cards.clear()
+        return True
+
+
+# -------------------------------------------------
+# STACK FILES
+# -------------------------------------------------
+# A stack file is JSON Lines: a header line, then one object per row with
+# "kind" naming the table. Both directions stream, so memory use does not
+# grow with the stack.
+
+STACK_FILE_FORMAT = "hypercard-stack"
+STACK_FILE_VERSION = 1
+IMPORT_BATCH_ROWS = 50_000
+
+STACK_TABLES = {
+    "stack": "id, name, start_card_id, script",
+    "background": "id, stack_id, name, script, layout_json",
+    "card": "id, stack_id, background_id, name, order_index, script",
+    "part": PART_COLUMNS,
+}
+
+# dropped during import and rebuilt once at the end (see SCHEMA_MIGRATIONS 1)
+STACK_INDEXES = {
+    "idx_card_stack_order": "card(stack_id, order_index)",
+    "idx_card_name": "card(name)",
+    "idx_part_card": "part(card_id)",
+    "idx_part_background": "part(background_id)",
+}
+
+
+@traced("db")
+def export_stack(conn: sqlite3.Connection, path: str) -> int:
+    """write every stack table to path; returns the number of rows written"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"format": STACK_FILE_FORMAT, "version": STACK_FILE_VERSION}) + "\n")
+        for kind, spec in STACK_TABLES.items():
+            # let SQLite build the JSON; this loop only copies strings
+            fields = ", ".join(f"'{c.strip()}', {c.strip()}" for c in spec.split(","))
+            for (line,) in conn.execute(f"SELECT json_object('kind', '{kind}', {fields}) FROM {kind} ORDER BY id"):
+                f.write(line)
+                f.write("\n")
+                count += 1
+    return count
+
+
+@traced("db")
+def import_stack(conn: sqlite3.Connection, path: str, batch_rows: int = IMPORT_BATCH_ROWS) -> int:
+    """replace the stack in conn with the one in path, in one transaction"""
+    columns = {kind: [c.strip() for c in spec.split(",")] for kind, spec in STACK_TABLES.items()}
+    inserts = {
+        kind: f"INSERT INTO {kind} ({spec}) VALUES ({', '.join('?' * len(columns[kind]))})"
+        for kind, spec in STACK_TABLES.items()
+    }
+    batches = {kind: [] for kind in STACK_TABLES}
+    count = 0
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("format") != STACK_FILE_FORMAT:
+            raise ValueError(f"{path}: not a stack file")
+        if header.get("version", 0) > STACK_FILE_VERSION:
+            raise ValueError(f"{path}: stack file version {header['version']} is newer than this app")
+        with conn:
+            # per-row triggers (the part_fts index) are dropped too and the
+            # index is rebuilt once at the end. DDL does not open the
+            # implicit transaction, so begin one here or a failed import
+            # would roll back everything but the dropped triggers.
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            triggers = conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'part'"
+            ).fetchall()
+            for name, _ in triggers:
+                conn.execute(f"DROP TRIGGER {name}")
+            for kind in STACK_TABLES:
+                conn.execute(f"DELETE FROM {kind}")
+            for name in STACK_INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+            for lineno, line in enumerate(f, 2):
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                kind = rec.get("kind")
+                if kind not in batches:
+                    raise ValueError(f"{path}:{lineno}: unknown kind {kind!r}")
+                batch = batches[kind]
+                batch.append(tuple(map(rec.get, columns[kind])))
+                if len(batch) >= batch_rows:
+                    conn.executemany(inserts[kind], batch)
+                    count += len(batch)
+                    batch.clear()
+            for kind, batch in batches.items():
+                conn.executemany(inserts[kind], batch)
+                count += len(batch)
+            for name, target in STACK_INDEXES.items():
+                conn.execute(f"CREATE INDEX {name} ON {target}")
+            for _, sql in triggers:
+                conn.execute(sql)
+            if triggers:
+                conn.execute("INSERT INTO part_fts(part_fts) VALUES ('rebuild')")
+    return count
+
+
+# -------------------------------------------------
+# SCRIPT ENGINE (now with get field + sql)
+# -------------------------------------------------
+
+class Statement:
+    def __init__(self, kind, args):
+        self.kind = kind
+        self.args = args
+
+
+class Handler:
+    def __init__(self, event, statements):
+        self.event = event
+        self.statements = statements
+        self.code = None  # compiled ops, see compile_handler
+
+
+class Script:
+    def __init__(self, handlers):
+        self.handlers = handlers
+
+
+SQL_PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_]\w*)\}")
+SQL_IDENT_CLOSE = {'"': '"', "`": "`", "[": "]"}
+
+
+def sql_verbatim_end(query: str, i: int) -> int:
+    """end of the quoted identifier or comment starting at i, or i if none starts there"""
+    ch = query[i]
+    if ch in SQL_IDENT_CLOSE:
+        close = SQL_IDENT_CLOSE[ch]
+        j = i + 1
+        while True:
+            j = query.find(close, j)
+            if j < 0:
+                return len(query)
+            if close != "]" and query.startswith(close * 2, j):
+                j += 2
+                continue
+            return j + 1
+    if query.startswith("--", i):
+        j = query.find("\n", i)
+        return len(query) if j < 0 else j
+    if query.startswith("/*", i):
+        j = query.find("*/", i + 2)
+        return len(query) if j < 0 else j + 2
+    return i
+
+
+def compile_sql_placeholders(query: str) -> tuple[str, tuple]:
+    """turn {var} into ? parameters; returns (sql, ((name, quoted), ...))
+
+    '{n}' binds the whole literal as text; a placeholder inside a longer
+    literal splits it: 'a{n}b' -> ('a' || ? || 'b'). A bare {n} outside
+    quotes binds as a number when the value looks like one. Quoted
+    identifiers and comments are copied as they are. A parameter can
+    only stand for a value, so {n} cannot name a table or column.
+    """
+    out = []
+    params = []
+    i, n = 0, len(query)
+    while i < n:
+        ch = query[i]
+        end = sql_verbatim_end(query, i)
+        if end > i:
+            out.append(query[i:end])
+            i = end
+            continue
+        if ch == "'":
+            j = start = i + 1
+            pieces = []
+            while j < n:
+                if query[j] == "'":
+                    if query.startswith("''", j):
+                        j += 2
+                        continue
+                    break
+                m = SQL_PLACEHOLDER_RE.match(query, j)
+                if m:
+                    pieces.append(("'" + query[start:j] + "'") if j > start else None)
+                    pieces.append("?")
+                    params.append((m.group(1), True))
+                    j = start = m.end()
+                    continue
+                j += 1
+            if "?" not in pieces:
+                out.append(query[i:j + 1])
+            else:
+                if j > start:
+                    pieces.append("'" + query[start:j] + "'")
+                exprs = [p for p in pieces if p]
+                out.append(exprs[0] if len(exprs) == 1 else "(" + " || ".join(exprs) + ")")
+            i = j + 1
+            continue
+        m = SQL_PLACEHOLDER_RE.match(query, i)
+        if m:
+            out.append("?")
+            params.append((m.group(1), False))
+            i = m.end()
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out), tuple(params)
+
+
+def sql_param_value(value, quoted: bool):
+    if value is None or quoted:
+        return value
+    text = str(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return value
+
+
+def bind_sql_params(params: tuple, values: dict) -> tuple:
+    # unknown vars bind as NULL
+    return tuple(sql_param_value(values.get(name), quoted) for name, quoted in params)
+
+
+def line_vars(line: str) -> dict:
+    """{line} is the whole line, {item1}, {item2}... its comma separated items"""
+    values = {"line": line}
+    for i, item in enumerate(line.split(","), 1):
+        values[f"item{i}"] = item.strip()
+    return values
+
+
+def parse_statement(line: str) -> Statement:
+    ll = line.lower()
+    # navigation
+    if ll == "go next card":
+        return Statement("go", {"target": "next"})
+    if ll == "go prev card":
+        return Statement("go", {"target": "prev"})
+    if ll.startswith("go card "):
+        rest = line[8:].strip()
+        if rest.startswith('"') and rest.endswith('"'):
+            return Statement("go", {"target": "name", "value": rest[1:-1]})
+        else:
+            return Statement("go", {"target": "number", "value": int(rest)})
+    # answer
+    if ll.startswith("answer "):
+        m = re.match(r'answer\s+"(.*)"\s*$', line, re.IGNORECASE)
+        if m:
+            return Statement("answer", {"text": m.group(1)})
+    # set field
+    if ll.startswith("set field "):
+        m = re.match(r'set field\s+"(.*)"\s+to\s+"(.*)"\s*$', line, re.IGNORECASE)
+        if m:
+            return Statement("set_field", {"field": m.group(1), "value": m.group(2)})
+    # get field
+    if ll.startswith("get field "):
+        m = re.match(r'get field\s+"(.*)"\s+into\s+"(.*)"\s*$', line, re.IGNORECASE)
+        if m:
+            return Statement("get_field", {"field": m.group(1), "var": m.group(2)})
+    # find
+    if ll.startswith("find "):
+        m = re.match(r'find\s+"(.*)"\s*$', line, re.IGNORECASE)
+        if m:
+            return Statement("find", {"text": m.group(1)})
+    # sql
+    if ll.startswith("sql "):
+        m = re.match(
+            r'sql\s+"(.*?)"(?:\s+into\s+"(.*?)"|\s+for\s+each\s+line\s+of\s+"(.*?)")?\s*$',
+            line, re.IGNORECASE
+        )
+        if m:
+            query = m.group(1)
+            sql, params = compile_sql_placeholders(query)
+            return Statement("sql", {
+                "query": query,
+                "sql": sql,
+                "params": params,
+                "into": m.group(2),
+                "each_line_of": m.group(3),
+            })
+    return Statement("noop", {})
+
+
+def parse_script(text: str) -> Script:
+    if not text:
+        return Script({})
+    lines = [l.strip() for l in text.splitlines()]
+    handlers = {}
+    current_event = None
+    current_statements = []
+
+    def flush():
+        nonlocal current_event, current_statements
+        if current_event:
+            handlers[current_event.lower()] = Handler(current_event.lower(), current_statements)
+            current_event = None
+            current_statements = []
+
+    for line in lines:
+        if not line:
+            continue
+        lower = line.lower()
+        if lower.startswith("on "):
+            flush()
+            current_event = line.split(None, 1)[1].strip()
+            current_statements = []
+        elif lower.startswith("end "):
+            flush()
+        else:
+            current_statements.append(parse_statement(line))
+
+    flush()
+    return Script(handlers)
+
+
+# -------------------------------------------------
+# COMPILER: Statement -> op(runtime)
+# -------------------------------------------------
+# Every statement is turned into a closure once, with its arguments
+# already pulled out of the args dict, so running a handler is a plain
+# loop over callables without any kind/target string compares.
+
+def _compile_go(args):
+    tgt = args["target"]
+    if tgt == "next":
+        return lambda rt: rt.api.go_next_card()
+    if tgt == "prev":
+        return lambda rt: rt.api.go_prev_card()
+    value = args["value"]
+    if tgt == "name":
+        return lambda rt: rt.api.go_card_by_name(value)
+    if tgt == "number":
+        return lambda rt: rt.api.go_card_by_number(value)
+    return None
+
+
+def _compile_answer(args):
+    text = args["text"]
+    return lambda rt: rt.api.answer(text)
+
+
+def _compile_set_field(args):
+    field, value = args["field"], args["value"]
+    return lambda rt: rt.api.set_field(field, value)
+
+
+def _compile_get_field(args):
+    field, var = args["field"], args["var"]
+    return lambda rt: rt.api.get_field(field, var)
+
+
+def _compile_find(args):
+    text = args["text"]
+    return lambda rt: rt.api.find(text)
+
+
+def _compile_sql(args):
+    sql, params, into = args["sql"], args["params"], args.get("into")
+    each = args.get("each_line_of")
+    if each:
+        def op(rt):
+            lines = [l for l in str(rt.vars.get(each, "")).splitlines() if l.strip()]
+            rows = [bind_sql_params(params, {**rt.vars, **line_vars(l)}) for l in lines]
+            rt.api.run_user_sql(sql, into, many=rows)
+        return op
+    if params:
+        return lambda rt: rt.api.run_user_sql(sql, into, bind_sql_params(params, rt.vars))
+    return lambda rt: rt.api.run_user_sql(sql, into)
+
+
+STATEMENT_COMPILERS = {
+    "go": _compile_go,
+    "answer": _compile_answer,
+    "set_field": _compile_set_field,
+    "get_field": _compile_get_field,
+    "find": _compile_find,
+    "sql": _compile_sql,
+}
+
+
+def compile_statement(stmt: Statement):
+    """return op(runtime) for stmt, or None for statements that do nothing"""
+    compiler = STATEMENT_COMPILERS.get(stmt.kind)
+    return compiler(stmt.args) if compiler else None
+
+
+def compile_handler(handler: Handler) -> tuple:
+    if handler.code is None:
+        ops = (compile_statement(stmt) for stmt in handler.statements)
+        handler.code = tuple(op for op in ops if op is not None)
+    return handler.code
+
+
+def op_name(op) -> str:
+    # ops are closures made by _compile_<kind>
+    return op.__qualname__.split(".", 1)[0].removeprefix("_compile_")
+
+
+def compile_script(script: Script) -> Script:
+    for handler in script.handlers.values():
+        compile_handler(handler)
+    return script
+
+
+EMPTY_SCRIPT = Script({})
+
+
+def script_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class ScriptCache:
+    """LRU of parsed scripts keyed by content hash, with hit/miss counters"""
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str) -> Script:
+        if not text:
+            return EMPTY_SCRIPT
+        key = script_key(text)
+        script = self.entries.get(key)
+        if script is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return script
+        self.misses += 1
+        with TRACER.span("script", "parse"):
+            script = compile_script(parse_script(text))
+        self.entries[key] = script
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return script
+
+    def invalidate(self, text: str | None):
+        if text:
+            self.entries.pop(script_key(text), None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+class AppApi:
+    """what scripts call into; ScriptRuntime only sees this
+
+    MainWindow implements it for the GUI and HeadlessApp for batch runs.
+    """
+
+    def go_next_card(self):
+        raise NotImplementedError
+
+    def go_prev_card(self):
+        raise NotImplementedError
+
+    def go_card_by_name(self, name: str):
+        raise NotImplementedError
+
+    def go_card_by_number(self, number: int):
+        raise NotImplementedError
+
+    def answer(self, text: str):
+        raise NotImplementedError
+
+    def set_field(self, field_name: str, value: str):
+        raise NotImplementedError
+
+    def get_field(self, field_name: str, var_name: str):
+        raise NotImplementedError
+
+    def run_user_sql(self, query: str, into: str | None, params: tuple = (), many: list | None = None):
+        raise NotImplementedError
+
+    def find(self, text: str):
+        raise NotImplementedError
+
+    def chain_finished(self):
+        """the outermost event chain returned"""
+
+
+class Continuation:
+    """a handler paused on an async api call; ScriptRuntime.resume picks it up"""
+
+    def __init__(self, vars):
+        self.vars = vars
+        self.code = ()
+        self.pc = 0
+
+
+class ScriptRuntime:
+    def __init__(self, app_api: AppApi):
+        self.api = app_api
+        self.vars = {}  # per-run vars
+        self.cache = ScriptCache()
+        self.suspending = None
+        self.depth = 0  # chains currently running; api.chain_finished runs when it drops to 0
+
+    def run_event_chain(self, event_name: str, scripts: list[str], owners: list[str] | None = None):
+        # fresh vars for this run; a chain started from inside another
+        # (openCard after go) must not clobber the outer run's vars
+        outer = self.vars
+        self.vars = {}
+        self.depth += 1
+        try:
+            event = event_name.lower()
+            for i, text in enumerate(scripts):
+                handler = self.cache.get(text).handlers.get(event)
+                if handler:
+                    owner = owners[i] if owners else f"script {i}"
+                    with TRACER.span("handler", f"{event_name} in {owner}"):
+                        self.run_handler(handler)
+                    break
+        finally:
+            self.vars = outer
+            self._leave()
+
+    def _leave(self):
+        self.depth -= 1
+        if self.depth == 0:
+            self.api.chain_finished()
+
+    def run_handler(self, handler: Handler):
+        self.run_code(compile_handler(handler), 0)
+
+    def run_code(self, code: tuple, pc: int):
+        n = len(code)
+        traced = TRACER.enabled
+        while pc < n:
+            if traced:
+                with Span(TRACER, "stmt", op_name(code[pc]), None):
+                    code[pc](self)
+            else:
+                code[pc](self)
+            pc += 1
+            if self.suspending is not None:
+                cont, self.suspending = self.suspending, None
+                cont.code, cont.pc = code, pc
+                return
+
+    def suspend(self) -> Continuation:
+        """for api calls that finish later: stop the handler after this op"""
+        self.suspending = Continuation(self.vars)
+        return self.suspending
+
+    def resume(self, cont: Continuation):
+        outer = self.vars
+        self.vars = cont.vars
+        self.depth += 1
+        try:
+            with TRACER.span("handler", "resume after sql"):
+                self.run_code(cont.code, cont.pc)
+        finally:
+            self.vars = outer
+            self._leave()
+
+
+# -------------------------------------------------
+# USER DB (script sql, off the UI thread)
+# -------------------------------------------------
+# Each worker thread has its own connection to the user DB. A progress
+# handler aborts a statement once it is cancelled or over its time
+# budget; cancel() also calls interrupt() on the worker's connection.
+# A SELECT shown in the Data Output dock stays open on a connection of
+# its own (ResultCursor) and is read in chunks as the grid scrolls. The
+# user DB is put in WAL mode so that open read does not lock out writes.
+
+USER_DB_PATH = "user_data.db"
+SQL_WORKERS = 2
+SQL_TIME_BUDGET_S = 10.0
+SQL_PROGRESS_OPS = 1000     # VM instructions between cancel/deadline checks
+SQL_STATEMENT_CACHE = 256   # prepared statements kept per user connection (LRU)
+RESULT_CHUNK_ROWS = 500     # rows fetched per grid scroll step / export batch
+RESULT_ROW_CAP = 100_000    # rows the grid keeps; export for the rest
+
+
+class SqlJob:
+    def __init__(self, query: str, into: str | None, params: tuple = (), many: list | None = None,
+                 budget: float = SQL_TIME_BUDGET_S):
+        self.query = query
+        self.into = into
+        self.params = params
+        self.many = many    # parameter rows for executemany
+        self.budget = budget
+        self.export = None  # (path, "csv" | "jsonl") to stream the result to a file
+        self.deadline = None
+        self.cancelled = False
+        self.conn = None
+        self.result = None
+        self.error = None
+        self.continuation = None
+
+
+def is_select(query: str) -> bool:
+    return query.strip().lower().startswith("select")
+
+
+class ResultCursor:
+    """an open SELECT on its own connection; fetch/close go through UserSqlPool"""
+
+    def __init__(self, conn: sqlite3.Connection, cursor: sqlite3.Cursor, query: str, params: tuple):
+        self.conn = conn
+        self.cursor = cursor
+        self.query = query
+        self.params = params
+        self.columns = [d[0] for d in cursor.description] if cursor.description else []
+        self.first_rows = []
+        self.exhausted = False
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def fetch(self, n: int) -> list:
+        rows = self.cursor.fetchmany(n)
+        if len(rows) < n:
+            self.exhausted = True
+        return rows
+
+
+def execute_user_sql(conn: sqlite3.Connection, job: SqlJob):
+    if job.many is not None:
+        with conn:
+            cur = conn.executemany(job.query, job.many)
+        if job.into:
+            job.result = str(cur.rowcount)
+        return
+    cur = conn.execute(job.query, job.params)
+    if is_select(job.query):
+        row = cur.fetchone()
+        job.result = str(row[0]) if row else ""
+    else:
+        conn.commit()
+        if job.into:
+            job.result = "ok"
+
+
+def export_rows(conn: sqlite3.Connection, job: SqlJob) -> int:
+    """stream every row of job.query to job.export's file; returns the row count"""
+    path, fmt = job.export
+    cur = conn.execute(job.query, job.params)
+    cols = [d[0] for d in cur.description] if cur.description else []
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(cols)
+        while True:
+            rows = cur.fetchmany(RESULT_CHUNK_ROWS)
+            if not rows:
+                break
+            if fmt == "csv":
+                writer.writerows(rows)
+            else:
+                for r in rows:
+                    f.write(json.dumps(dict(zip(cols, r)), default=str))
+                    f.write("\n")
+            count += len(rows)
+    return count
+
+
+class UserSqlPool:
+    def __init__(self, path: str = USER_DB_PATH, workers: int = SQL_WORKERS):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="user-sql")
+        self.local = threading.local()
+        self.wal = False
+
+    def _connect(self, **kw) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, **kw)
+        if not self.wal:
+            # a grid result keeps its read transaction open between
+            # fetches; in WAL mode that does not block script writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.wal = True
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self._connect(cached_statements=SQL_STATEMENT_CACHE)
+            self.local.conn = conn
+        return conn
+
+    def submit(self, job: SqlJob, on_done):
+        """run job on a worker; on_done(job) is called on that worker thread"""
+        self.executor.submit(self._run, job, on_done)
+
+    def _run(self, job: SqlJob, on_done):
+        browse = job.export is None and job.many is None and not job.into and is_select(job.query)
+        if browse:
+            conn = self._connect(check_same_thread=False)
+        else:
+            conn = self._connection()
+        job.deadline = time.monotonic() + job.budget
+        conn.set_progress_handler(
+            lambda: int(job.cancelled or time.monotonic() > job.deadline), SQL_PROGRESS_OPS
+        )
+        job.conn = conn
+        try:
+            if job.cancelled:
+                raise sqlite3.OperationalError("interrupted")
+            with TRACER.span("sql", job.query[:80], {"params": len(job.params), "many": job.many is not None}):
+                if browse:
+                    job.result = self._open_result(conn, job)
+                elif job.export:
+                    job.result = export_rows(conn, job)
+                else:
+                    execute_user_sql(conn, job)
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if job.cancelled:
+                job.error = "cancelled"
+            elif time.monotonic() > job.deadline:
+                job.error = f"timed out after {job.budget:g}s"
+            else:
+                job.error = str(e)
+            if browse:
+                conn.close()
+        finally:
+            job.conn = None
+            if not browse:
+                conn.set_progress_handler(None, 0)
+        on_done(job)
+
+    def _open_result(self, conn: sqlite3.Connection, job: SqlJob) -> ResultCursor:
+        result = ResultCursor(conn, conn.execute(job.query, job.params), job.query, job.params)
+        result.first_rows = result.fetch(RESULT_CHUNK_ROWS)
+        # from here on only closing the result interrupts it
+        conn.set_progress_handler(lambda: int(result.closed), SQL_PROGRESS_OPS)
+        return result
+
+    def fetch(self, result: ResultCursor, n: int, on_done):
+        """fetch up to n more rows on a worker; on_done(rows, error) runs there"""
+        def work():
+            with result.lock:
+                if result.closed:
+                    return
+                try:
+                    with TRACER.span("sql", "fetch", {"rows": n}):
+                        rows, error = result.fetch(n), None
+                except Exception as e:
+                    result.exhausted = True
+                    rows, error = [], str(e)
+            on_done(rows, error)
+        self.executor.submit(work)
+
+    def close_result(self, result: ResultCursor):
+        result.closed = True
+        def work():
+            with result.lock:
+                result.conn.close()
+        self.executor.submit(work)
+
+    def cancel(self, job: SqlJob):
+        job.cancelled = True
+        conn = job.conn
+        if conn is not None:
+            conn.interrupt()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# -------------------------------------------------
+# CARD STATE
+# -------------------------------------------------
+
+def field_checksum(text: str) -> str:
+    """adler32 of the UTF-8 text as hex, matching adler32() in the page"""
+    return format(zlib.adler32(text.encode("utf-8", "replace")), "x")
+
+
+def apply_text_delta(text: str, offset: int, removed: int, inserted: str) -> str | None:
+    if offset < 0 or removed < 0 or offset + removed > len(text):
+        return None
+    return text[:offset] + inserted + text[offset + removed:]
+
+
+def part_view_state(part: Part) -> dict:
+    """what the page needs to draw one part; compared to decide what to patch"""
+    text = part.text
+    if text is None:
+        text = (part.name or "Button") if part.type == "button" else ""
+    return {
+        "id": part.id,
+        "type": part.type,
+        "x": 0 if part.x is None else part.x,
+        "y": 0 if part.y is None else part.y,
+        "width": 100 if part.width is None else part.width,
+        "height": 30 if part.height is None else part.height,
+        "text": text,
+        "lockText": bool(part.lock_text),
+    }
+
+
+# -------------------------------------------------
+# CARD SNAPSHOT CACHE
+# -------------------------------------------------
+
+class BackgroundLayer:
+    """a background's parts and their page state, shared by all its cards"""
+
+    def __init__(self, background_id, parts, view, version):
+        self.background_id = background_id
+        self.parts = parts
+        self.view = view
+        self.version = version
+
+
+class CardSnapshot:
+    """a card's own parts and their page state, plus its background layer"""
+
+    def __init__(self, card, background, parts, view, version):
+        self.card = card
+        self.background = background
+        self.parts = parts
+        self.view = view
+        self.version = version
+        self.bg_layer = None  # set by CardSnapshotCache.get
+
+
+class CardSnapshotCache:
+    """bounded LRU of CardSnapshots, and one BackgroundLayer per background
+
+    Each card and each background has a version counter; a snapshot or
+    layer is valid while its counter still matches what it was built
+    with. Write paths bump the counters through invalidate_card/
+    _background/_part, so a background edit rebuilds only that layer and
+    leaves the snapshots of its cards alone.
+    """
+
+    def __init__(self, model: StackModel, max_size: int = 64):
+        self.model = model
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.bg_layers = {}
+        self.card_versions = {}
+        self.bg_versions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, card_id):
+        snap = self.entries.get(card_id)
+        if snap is not None and snap.version == self.card_versions.get(card_id, 0):
+            return snap
+        return None
+
+    def get(self, card_id: int) -> CardSnapshot | None:
+        snap = self._lookup(card_id)
+        if snap is not None:
+            self.entries.move_to_end(card_id)
+            self.hits += 1
+        else:
+            self.misses += 1
+            snap = self.load(card_id)
+            if snap is None:
+                return None
+        snap.bg_layer = self.background_layer(snap.card.background_id)
+        return snap
+
+    def load(self, card_id: int) -> CardSnapshot | None:
+        card = self.model.card(card_id)
+        if card is None:
+            self.entries.pop(card_id, None)
+            return None
+        parts = self.model.card_parts(card_id)
+        snap = CardSnapshot(
+            card,
+            self.model.background(card.background_id),
+            parts,
+            [part_view_state(p) for p in parts],
+            self.card_versions.get(card_id, 0),
+        )
+        self.entries[card_id] = snap
+        self.entries.move_to_end(card_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return snap
+
+    def background_layer(self, bg_id: int | None) -> BackgroundLayer:
+        version = self.bg_versions.get(bg_id, 0)
+        layer = self.bg_layers.get(bg_id)
+        if layer is None or layer.version != version:
+            parts = self.model.background_parts(bg_id) if bg_id is not None else []
+            layer = BackgroundLayer(bg_id, parts, [part_view_state(p) for p in parts], version)
+            self.bg_layers[bg_id] = layer
+        return layer
+
+    def prefetch(self, card_id: int):
+        if self._lookup(card_id) is None:
+            snap = self.load(card_id)
+            if snap is not None:
+                self.background_layer(snap.card.background_id)
+
+    def invalidate_card(self, card_id: int):
+        self.card_versions[card_id] = self.card_versions.get(card_id, 0) + 1
+
+    def invalidate_background(self, bg_id: int):
+        self.bg_versions[bg_id] = self.bg_versions.get(bg_id, 0) + 1
+
+    def invalidate_part(self, part: Part):
+        if part.card_id is not None:
+            self.invalidate_card(part.card_id)
+        if part.background_id is not None:
+            self.invalidate_background(part.background_id)
+
+    def drop(self, card_id: int):
+        self.entries.pop(card_id, None)
+        self.card_versions.pop(card_id, None)
+
+
+# -------------------------------------------------
+# STACK SESSION
+# -------------------------------------------------
+
+class StackSession(AppApi):
+    """the script API over a StackModel, shared by MainWindow and HeadlessApp
+
+    Navigation only queues openCard; chain_finished runs the queue once
+    the outermost chain returns and then calls render_pending_view.
+    Subclasses supply answer and run_user_sql and may override the hooks
+    (flush_model, part_changed, render_pending_view, show_status).
+    """
+
+    def start_session(self, model: StackModel):
+        self.model = model
+        self.runtime = ScriptRuntime(self)
+        self.current_card_id = model.first_card_id()
+        self.render_pending = False
+        self.open_card_queue = deque()
+        self.draining = False
+
+    # ---------------- hooks ----------------
+    def flush_model(self):
+        self.model.flush()
+
+    def part_changed(self, part: Part):
+        pass
+
+    def render_pending_view(self):
+        self.render_pending = False
+
+    def show_status(self, text: str):
+        print(text, file=sys.stderr)
+
+    # ---------------- events ----------------
+    def click_part(self, part: Part | None):
+        card = self.model.card(self.current_card_id)
+        bg = self.model.background(card.background_id)
+        self.runtime.run_event_chain(
+            "click",
+            [part.script if part else "", card.script or "", (bg.script or "") if bg else "", ""],
+            [f"{part.type} {part.name}" if part else "part", f"card {card.name}", "background", "stack"],
+        )
+
+    def run_open_card_scripts(self):
+        card = self.model.card(self.current_card_id)
+        bg = self.model.background(card.background_id)
+        self.runtime.run_event_chain(
+            "openCard",
+            [card.script or "", (bg.script or "") if bg else "", ""],
+            [f"card {card.name}", "background", "stack"],
+        )
+
+    def expand_vars(self, text: str) -> str:
+        for k, v in self.runtime.vars.items():
+            text = text.replace("{" + k + "}", str(v))
+        return text
+
+    # ---------------- script API ----------------
+    def go_to_card(self, card_id: int):
+        # openCard is queued, not run from inside the handler that went here
+        self.flush_model()
+        self.current_card_id = card_id
+        self.render_pending = True
+        self.open_card_queue.append(card_id)
+        if not self.runtime.depth:
+            self.chain_finished()
+
+    def chain_finished(self):
+        """outermost event chain returned: run queued openCards, then render once"""
+        if self.draining:
+            return
+        self.draining = True
+        try:
+            runs = 0
+            while self.open_card_queue:
+                if runs == MAX_OPEN_CARD_CHAINS:
+                    self.open_card_queue.clear()
+                    self.show_status("openCard: too many go commands in a row, stopped")
+                    break
+                cid = self.open_card_queue.popleft()
+                if self.model.card(cid) is None:
+                    continue
+                self.current_card_id = cid
+                runs += 1
+                self.run_open_card_scripts()
+        finally:
+            self.draining = False
+        self.render_pending_view()
+
+    def go_next_card(self):
+        self.go_to_card(self.model.next_card_id(self.current_card_id))
+
+    def go_prev_card(self):
+        prev = self.model.prev_card_id(self.current_card_id)
+        if prev != self.current_card_id:
+            self.go_to_card(prev)
+
+    def go_card_by_name(self, name: str):
+        cid = self.model.card_id_by_name(name)
+        if cid is not None:
+            self.go_to_card(cid)
+
+    def go_card_by_number(self, number: int):
+        cid = self.model.card_id_by_number(number)
+        if cid is not None:
+            self.go_to_card(cid)
+
+    def set_field(self, field_name: str, value: str):
+        p = self.model.find_part(self.model.card(self.current_card_id), "field", field_name)
+        if p is not None:
+            self.model.set_part_props(p, text=value)
+            self.part_changed(p)
+            self.render_pending = True
+
+    def get_field(self, field_name: str, var_name: str):
+        """read current card's field text and store to runtime var"""
+        p = self.model.find_part(self.model.card(self.current_card_id), "field", field_name)
+        self.runtime.vars[var_name] = (p.text or "") if p is not None else ""
+
+    def find(self, text: str):
+        """go to the next card whose field text matches; {result} is "not found" otherwise"""
+        cid = self.find_card(self.expand_vars(text))
+        self.runtime.vars["result"] = "" if cid is not None else "not found"
+        if cid is not None and cid != self.current_card_id:
+            self.go_to_card(cid)
+
+    def find_card(self, text: str, columns: str = "text") -> int | None:
+        self.flush_model()  # the index only sees flushed rows
+        return self.model.find_card(text, self.current_card_id, columns)
+
+
+# -------------------------------------------------
+# HEADLESS RUNNER
+# -------------------------------------------------
+# `python hypercard.py run STACK [events...]` opens a stack (a .db file or
+# a .jsonl stack export), fires the events in order and prints answers and
+# query results to stdout. SQL runs inline on one user DB connection.
+
+class HeadlessApp(StackSession):
+    def __init__(self, conn: sqlite3.Connection, user_db: str = USER_DB_PATH, out=None):
+        self.start_session(StackModel(conn))
+        stack = next(iter(self.model.stacks.values()), None)
+        if stack is not None and self.model.card(stack.start_card_id) is not None:
+            self.current_card_id = stack.start_card_id
+        self.user_conn = sqlite3.connect(user_db, cached_statements=SQL_STATEMENT_CACHE)
+        self.out = out or sys.stdout
+        self.errors = 0
+
+    def find_part_by_name(self, name: str) -> Part | None:
+        card = self.model.card(self.current_card_id)
+        return self.model.find_part(card, "button", name) or self.model.find_part(card, "field", name)
+
+    def answer(self, text: str):
+        print(self.expand_vars(text), file=self.out)
+
+    def run_user_sql(self, query: str, into: str | None, params: tuple = (), many: list | None = None):
+        job = SqlJob(query, into, params, many)
+        try:
+            if into or many is not None or not is_select(query):
+                execute_user_sql(self.user_conn, job)
+            else:
+                # a plain SELECT prints its rows, tab separated
+                cur = self.user_conn.execute(query, params)
+                print("\t".join(d[0] for d in cur.description), file=self.out)
+                for rows in iter(lambda: cur.fetchmany(RESULT_CHUNK_ROWS), []):
+                    for row in rows:
+                        print("\t".join("NULL" if v is None else str(v) for v in row), file=self.out)
+        except sqlite3.Error as e:
+            if self.user_conn.in_transaction:
+                self.user_conn.rollback()
+            self.errors += 1
+            self.sql_failed(query, e)
+            return
+        if into:
+            self.runtime.vars[into] = job.result
+
+    def sql_failed(self, query: str, error: sqlite3.Error):
+        print(f"SQL error: {error}", file=sys.stderr)
+
+    def close(self):
+        self.model.flush()
+        self.user_conn.close()
+
+
+def open_stack(path: str) -> sqlite3.Connection:
+    """a .jsonl stack export is loaded into memory; anything else is a stack DB"""
+    if path.endswith(".jsonl"):
+        conn = sqlite3.connect(":memory:")
+        init_db(conn)
+        import_stack(conn, path)
+        return conn
+    # mode=rw: a mistyped path is an error, not a new "Untitled" stack
+    conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=rw", uri=True)
+    tune_db(conn)
+    init_db(conn)
+    return conn
+
+
+def cli_main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(
+        prog="hypercard.py run",
+        description="Run stack scripts without a window. Events fire in the order given.",
+    )
+    ap.add_argument("stack", help="stack DB file, or a .jsonl stack export (changes are not saved)")
+    ap.add_argument("--user-db", default=USER_DB_PATH, help="user DB for sql commands")
+    ap.add_argument("--card", help="start on this card (name or number)")
+    ap.add_argument("--open-card", dest="events", action="append_const", const=("openCard", None),
+                    help="send openCard to the current card")
+    ap.add_argument("--click", dest="events", action="append", type=lambda v: ("click", v), metavar="PART",
+                    help="click the part with this name on the current card")
+    ap.add_argument("--set", dest="events", action="append", type=lambda v: ("set", v), metavar="FIELD=TEXT",
+                    help="put text into a field on the current card")
+    ap.add_argument("--go", dest="events", action="append", type=lambda v: ("go", v), metavar="CARD",
+                    help="go to a card by name or number (runs its openCard)")
+    ap.add_argument("--trace", metavar="PATH", help="write a Chrome trace of the run here")
+    args = ap.parse_args(argv)
+    if not os.path.exists(args.stack):
+        ap.error(f"{args.stack}: no such stack")
+
+    TRACER.enabled = bool(args.trace)
+    app = HeadlessApp(open_stack(args.stack), args.user_db)
+    try:
+        if args.card:
+            cid = app.model.card_id_by_name(args.card)
+            if cid is None and args.card.isdigit():
+                cid = app.model.card_id_by_number(int(args.card))
+            if cid is None:
+                ap.error(f"no card {args.card!r}")
+            app.current_card_id = cid
+        for kind, value in args.events or ():
+            if kind == "openCard":
+                app.run_open_card_scripts()
+            elif kind == "click":
+                part = app.find_part_by_name(value)
+                if part is None:
+                    print(f"no part named {value!r} on this card", file=sys.stderr)
+                    return 1
+                app.click_part(part)
+            elif kind == "set":
+                name, _, text = value.partition("=")
+                app.set_field(name, text)
+            elif kind == "go":
+                if value.isdigit():
+                    app.go_card_by_number(int(value))
+                else:
+                    app.go_card_by_name(value)
+    finally:
+        app.close()
+        if args.trace:
+            TRACER.export(args.trace)
+    return 1 if app.errors else 0
+
+
+# -------------------------------------------------
+# VALIDATOR
+# -------------------------------------------------
+# `python hypercard.py validate STACK` checks every script for lines the
+# parser drops (they become noop) and then clicks every button. Cards are
+# split into chunks and handed to a process pool. Every chunk runs against
+# fresh in-memory copies of the stack and user DB, so clicks can write
+# freely and what one chunk writes never reaches another: the report is
+# the same for any number of workers. Buttons within a chunk do see each
+# other's writes. The source files are only opened read-only. The parent
+# merges the chunk results into one report.
+
+VALIDATE_CHUNK_CARDS = 500
+
+
+def lint_script(text: str) -> list[tuple[int, str, str]]:
+    """(line number, line, problem) for every handler line that does nothing"""
+    problems = []
+    in_handler = False
+    for lineno, raw in enumerate((text or "").splitlines(), 1):
+        line = raw.strip()
+        lower = line.lower()
+        if not line:
+            continue
+        if lower.startswith("on "):
+            in_handler = True
+        elif lower.startswith("end "):
+            in_handler = False
+        elif in_handler:
+            try:
+                if parse_statement(line).kind == "noop":
+                    problems.append((lineno, line, "not understood (noop)"))
+            except Exception as e:
+                problems.append((lineno, line, f"parse error: {e}"))
+    return problems
+
+
+class ValidatorApp(HeadlessApp):
+    """HeadlessApp that records problems instead of printing them"""
+
+    def __init__(self, conn: sqlite3.Connection, user_conn: sqlite3.Connection):
+        self.start_session(StackModel(conn))
+        self.user_conn = user_conn
+        self.out = open(os.devnull, "w")
+        self.errors = 0
+        self.problems = []
+
+    def sql_failed(self, query: str, error: sqlite3.Error):
+        self.problems.append(f"sql error: {error} in {query!r}")
+
+    def show_status(self, text: str):
+        self.problems.append(text)
+
+
+_snapshots = None  # per worker process: pristine (stack, user DB) copies
+
+
+def snapshot_db(path: str) -> sqlite3.Connection:
+    """an in-memory copy of the DB at path (or of the connection path), read-only on the source"""
+    mem = sqlite3.connect(":memory:")
+    if isinstance(path, sqlite3.Connection):
+        path.backup(mem)
+    elif path and os.path.exists(path):
+        src = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+        try:
+            src.backup(mem)
+        finally:
+            src.close()
+    return mem
+
+
+def _validator_init(stack_path: str, user_db: str):
+    global _snapshots
+    stack = snapshot_db(stack_path)
+    init_db(stack)  # migrations run on the copy, never on the user's file
+    _snapshots = (stack, snapshot_db(user_db))
+
+
+def _validate_chunk(card_ids: list[int], scripts_only: bool) -> dict:
+    app = ValidatorApp(snapshot_db(_snapshots[0]), snapshot_db(_snapshots[1]))
+    model = app.model
+    parse, clicks = [], []
+    buttons = 0
+    for cid in card_ids:
+        card = model.card(cid)
+        if card is None:
+            continue
+        owned = [(f"card {card.name}", card.script)]
+        parts = model.card_parts(cid)
+        owned += [(f"card {card.name}: {p.type} {p.name}", p.script) for p in parts]
+        for owner, text in owned:
+            for lineno, line, problem in lint_script(text):
+                parse.append({"owner": owner, "line": lineno, "text": line, "problem": problem})
+        if scripts_only:
+            continue
+        for part in parts:
+            if part.type != "button":
+                continue
+            buttons += 1
+            app.current_card_id = cid
+            app.problems = []
+            try:
+                app.click_part(part)
+            except Exception as e:
+                app.problems.append(f"{type(e).__name__}: {e}")
+            for problem in app.problems:
+                clicks.append({"owner": f"card {card.name}: button {part.name}", "problem": problem})
+        # written to the snapshot only, so layers the clicks touched can be evicted
+        model.flush()
+    app.out.close()
+    return {"cards": len(card_ids), "buttons": buttons, "parse": parse, "clicks": clicks}
+
+
+def validate_stack(stack_path: str, user_db: str = USER_DB_PATH, workers: int | None = None,
+                   scripts_only: bool = False, chunk_cards: int = VALIDATE_CHUNK_CARDS) -> dict:
+    """lint every script and click every button of the stack DB at stack_path"""
+    if not os.path.exists(stack_path):
+        raise FileNotFoundError(f"{stack_path}: no such stack")
+    conn = snapshot_db(stack_path)
+    init_db(conn)
+    model = StackModel(conn)
+    report = {"cards": 0, "buttons": 0, "parse": [], "clicks": []}
+    # stack and background scripts are checked once, here
+    for owner, text in (
+        [(f"stack {st.name}", st.script) for st in model.stacks.values()]
+        + [(f"background {bg.name}", bg.script) for bg in model.backgrounds.values()]
+        + [(f"background {bg.name}: {p.type} {p.name}", p.script)
+           for bg in model.backgrounds.values() for p in model.background_parts(bg.id)]
+    ):
+        for lineno, line, problem in lint_script(text):
+            report["parse"].append({"owner": owner, "line": lineno, "text": line, "problem": problem})
+    ids = list(model.card_ids())
+    conn.close()
+    chunks = [ids[i:i + chunk_cards] for i in range(0, len(ids), chunk_cards)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_validator_init,
+                             initargs=(stack_path, user_db)) as pool:
+        for part in pool.map(_validate_chunk, chunks, [scripts_only] * len(chunks)):
+            report["cards"] += part["cards"]
+            report["buttons"] += part["buttons"]
+            report["parse"].extend(part["parse"])
+            report["clicks"].extend(part["clicks"])
+    return report
+
+
+def validate_main(argv: list[str]) -> int:
+    ap = argparse.ArgumentParser(
+        prog="hypercard.py validate",
+        description="Check every script of a stack and click every button, in parallel. Nothing is saved.",
+    )
+    ap.add_argument("stack", help="stack DB file, or a .jsonl stack export")
+    ap.add_argument("--user-db", default=USER_DB_PATH, help="user DB the clicks run against (copied)")
+    ap.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--scripts-only", action="store_true", help="only check scripts, click nothing")
+    ap.add_argument("--json", metavar="PATH", help="write the full report here")
+    args = ap.parse_args(argv)
+
+    stack_path = args.stack
+    if not os.path.exists(stack_path):
+        ap.error(f"{stack_path}: no such stack")
+    tmp = None
+    if stack_path.endswith(".jsonl"):
+        # workers need a DB file to copy from
+        import tempfile
+        fd, tmp = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        conn = sqlite3.connect(tmp)
+        init_db(conn)
+        import_stack(conn, stack_path)
+        conn.close()
+        stack_path = tmp
+    try:
+        t = time.perf_counter()
+        report = validate_stack(stack_path, args.user_db, args.workers, args.scripts_only)
+        report["seconds"] = round(time.perf_counter() - t, 3)
+    finally:
+        if tmp:
+            os.remove(tmp)
+
+    for p in report["parse"]:
+        print(f"{p['owner']}, line {p['line']}: {p['problem']}: {p['text']}")
+    for c in report["clicks"]:
+        print(f"{c['owner']}: {c['problem']}")
+    print(
+        f"{report['cards']} cards, {report['buttons']} buttons clicked, "
+        f"{len(report['parse'])} script problems, {len(report['clicks'])} click problems "
+        f"in {report['seconds']}s",
+        file=sys.stderr,
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    return 1 if report["parse"] or report["clicks"] else 0
@@ -0,0 +1,1513 @@
+"""HyperCard Lite GUI: Qt WebEngine card page, docks and the main window."""
+
+import sys
+import json
+import time
+import sqlite3
+from collections import deque
+
+from PySide6.QtCore import (
+    QObject, Signal, Slot, QUrl, Qt, QTimer, QAbstractTableModel, QAbstractListModel, QModelIndex
+)
+from PySide6.QtGui import QAction
+from PySide6.QtWidgets import (
+    QApplication, QMainWindow, QMessageBox, QDockWidget, QListView,
+    QWidget, QFormLayout, QLineEdit, QSpinBox, QCheckBox, QTextEdit,
+    QPushButton, QVBoxLayout, QHBoxLayout, QDialog, QDialogButtonBox,
+    QLabel, QProgressBar, QTableView, QFileDialog, QTableWidget, QTableWidgetItem,
+    QComboBox, QHeaderView
+)
+from PySide6.QtWebEngineWidgets import QWebEngineView
+from PySide6.QtWebChannel import QWebChannel
+
+from hypercard_engine import (
+    DB_PATH, FLUSH_IDLE_MS, FLUSH_MAX_DELAY_MS, RESULT_CHUNK_ROWS, RESULT_ROW_CAP,
+    TRACER, traced, RuntimeDb, Part, part_rect, StackModel, CardSnapshot, CardSnapshotCache, export_stack, import_stack,
+    StackSession, SqlJob, ResultCursor, UserSqlPool, field_checksum, apply_text_delta,
+)
+
+# -------------------------------------------------
+# QT BRIDGE
+# -------------------------------------------------
+
+class SqlResultRelay(QObject):
+    # carries finished SqlJobs from pool threads to the UI thread
+    finished = Signal(object)
+
+
+# Page events are queued by the Bridge slots and handled on a timer tick,
+# a frame after the first one arrives. Within a batch a later snap probe
+# of a drag drops the earlier ones, consecutive field deltas are applied
+# together and full field text drops the edits before it; clicks are
+# never merged and nothing is merged across one. Each event carries the
+# page generation it was made on; clicks, drags and marquees made on an
+# older page (another card or mode) are dropped instead of hitting stale ids.
+
+BRIDGE_FRAME_MS = 16        # delay from the first queued event to the tick
+BRIDGE_TICK_BUDGET_MS = 50  # events left after this wait for the next tick
+
+# event -> earlier events of the same part it makes redundant
+SUPERSEDES = {
+    "dragProbe": ("dragProbe",),
+    "fieldChecksum": ("fieldChecksum",),
+    "fieldChanged": ("fieldChanged", "fieldEdited", "fieldChecksum"),
+}
+# dropped when the page has moved on
+PAGE_BOUND_EVENTS = ("partClicked", "partsMoved", "dragProbe", "marqueeSelected")
+
+
+def coalesce_bridge_events(events) -> deque:
+    """events are (name, generation, part id, *args); fieldEdited carries a list of deltas"""
+    out = []
+    seen = {}  # (name, part id) -> index in out since the last barrier
+    for ev in events:
+        name = ev[0]
+        if name in ("partClicked", "pageReady"):
+            seen.clear()  # a script may read what came before
+            out.append(ev)
+            continue
+        pid = ev[2]
+        for old in SUPERSEDES.get(name, ()):
+            i = seen.pop((old, pid), None)
+            if i is not None:
+                out[i] = None
+        if name == "fieldEdited" and seen.get((name, pid)) == len(out) - 1:
+            out[-1] = (name, ev[1], pid, out[-1][3] + ev[3])
+            continue
+        seen[(name, pid)] = len(out)
+        out.append(ev)
+    return deque(ev for ev in out if ev is not None)
+
+
+class Bridge(QObject):
+    # JSON messages for the card page renderer (see CARD_PAGE_HTML)
+    pageUpdate = Signal(str)
+
+    def __init__(self, main_window):
+        super().__init__()
+        self.main_window = main_window
+        self.events = deque()
+        self.draining = False
+        self.dropped = 0
+        self.tick = QTimer(self)
+        self.tick.setSingleShot(True)
+        self.tick.setInterval(BRIDGE_FRAME_MS)
+        self.tick.timeout.connect(self.drain)
+        self.handlers = {
+            "pageReady": main_window.handle_page_ready,
+            "partClicked": main_window.handle_part_clicked,
+            "fieldChanged": main_window.handle_field_changed,
+            "fieldEdited": main_window.handle_field_edited,
+            "fieldChecksum": main_window.handle_field_checksum,
+            "partsMoved": main_window.handle_parts_moved,
+            "dragProbe": main_window.handle_drag_probe,
+            "marqueeSelected": main_window.handle_marquee_selected,
+        }
+
+    def post(self, *event):
+        self.events.append(event)
+        if not self.tick.isActive():
+            self.tick.start()
+
+    def drain(self):
+        if self.draining:
+            # a handler is inside a nested event loop (answer dialog); go on after it
+            self.tick.start()
+            return
+        self.draining = True
+        # drop stale events before coalescing so they cannot supersede current ones
+        batch = coalesce_bridge_events(ev for ev in self.events if not self.stale(ev))
+        self.events.clear()
+        deadline = time.perf_counter() + BRIDGE_TICK_BUDGET_MS / 1000
+        try:
+            while batch and time.perf_counter() < deadline:
+                self.dispatch(*batch.popleft())
+        finally:
+            self.draining = False
+            self.events.extendleft(reversed(batch))
+            if self.events:
+                self.tick.start()
+
+    def stale(self, event) -> bool:
+        if event[0] in PAGE_BOUND_EVENTS and event[1] != self.main_window.page_generation:
+            self.dropped += 1
+            return True
+        return False
+
+    def dispatch(self, name: str, generation: int, *args):
+        # a click earlier in the batch may have changed the page
+        if self.stale((name, generation)):
+            return
+        with TRACER.span("bridge", name):
+            self.handlers[name](*args)
+
+    @Slot()
+    def pageReady(self):
+        self.post("pageReady", 0)
+
+    @Slot(int, int)
+    def partClicked(self, generation: int, part_id: int):
+        self.post("partClicked", generation, part_id)
+
+    @Slot(int, int, str)
+    def fieldChanged(self, generation: int, part_id: int, new_text: str):
+        self.post("fieldChanged", generation, part_id, new_text)
+
+    @Slot(int, int, int, int, str)
+    def fieldEdited(self, generation: int, part_id: int, offset: int, removed: int, inserted: str):
+        self.post("fieldEdited", generation, part_id, [(offset, removed, inserted)])
+
+    @Slot(int, int, str, int)
+    def fieldChecksum(self, generation: int, part_id: int, checksum: str, length: int):
+        self.post("fieldChecksum", generation, part_id, checksum, length)
+
+    # part ids come as a JSON list; kept as a tuple so events can be keyed on them
+    @Slot(int, str, int, int)
+    def partsMoved(self, generation: int, part_ids: str, dx: int, dy: int):
+        self.post("partsMoved", generation, tuple(json.loads(part_ids)), dx, dy)
+
+    @Slot(int, str, int, int, int, int)
+    def dragProbe(self, generation: int, part_ids: str, x0: int, y0: int, x1: int, y1: int):
+        self.post("dragProbe", generation, tuple(json.loads(part_ids)), (x0, y0, x1, y1))
+
+    @Slot(int, int, int, int, int)
+    def marqueeSelected(self, generation: int, x0: int, y0: int, x1: int, y1: int):
+        self.post("marqueeSelected", generation, (x0, y0, x1, y1))
+
+
+# -------------------------------------------------
+# PROPERTY PANEL
+# -------------------------------------------------
+
+class PartPropertyPanel(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.part_id = None
+
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+
+        self.name_edit = QLineEdit()
+        form.addRow("Name", self.name_edit)
+
+        self.x_edit = QSpinBox(); self.x_edit.setRange(0, 2000)
+        form.addRow("X", self.x_edit)
+
+        self.y_edit = QSpinBox(); self.y_edit.setRange(0, 2000)
+        form.addRow("Y", self.y_edit)
+
+        self.w_edit = QSpinBox(); self.w_edit.setRange(10, 2000)
+        form.addRow("Width", self.w_edit)
+
+        self.h_edit = QSpinBox(); self.h_edit.setRange(10, 2000)
+        form.addRow("Height", self.h_edit)
+
+        self.text_edit = QLineEdit()
+        form.addRow("Text", self.text_edit)
+
+        self.lock_chk = QCheckBox("Lock text")
+        form.addRow(self.lock_chk)
+
+        self.script_edit = QTextEdit()
+        form.addRow("Script", self.script_edit)
+
+        layout.addLayout(form)
+
+        self.apply_btn = QPushButton("Apply")
+        layout.addWidget(self.apply_btn)
+        layout.addStretch(1)
+
+    def set_part_data(self, part_id, ptype, name, props: dict, script: str):
+        self.part_id = part_id
+        self.name_edit.setText(name or "")
+        self.x_edit.setValue(int(props.get("x", 0)))
+        self.y_edit.setValue(int(props.get("y", 0)))
+        self.w_edit.setValue(int(props.get("width", 100)))
+        self.h_edit.setValue(int(props.get("height", 30)))
+        self.text_edit.setText(props.get("text", ""))
+        self.lock_chk.setChecked(bool(props.get("lockText", False)))
+        self.script_edit.setPlainText(script or "")
+
+    def collect_data(self):
+        return {
+            "part_id": self.part_id,
+            "name": self.name_edit.text(),
+            "x": self.x_edit.value(),
+            "y": self.y_edit.value(),
+            "width": self.w_edit.value(),
+            "height": self.h_edit.value(),
+            "text": self.text_edit.text(),
+            "lockText": self.lock_chk.isChecked(),
+            "script": self.script_edit.toPlainText(),
+        }
+
+
+# -------------------------------------------------
+# RESULT GRID
+# -------------------------------------------------
+
+class SqlResultModel(QAbstractTableModel):
+    """rows of a ResultCursor, fetched a chunk at a time as the view scrolls"""
+
+    rowsFetched = Signal(object, object)  # rows, error; emitted on a pool thread
+    statusChanged = Signal()
+
+    def __init__(self, result: ResultCursor, pool: UserSqlPool, cap: int = RESULT_ROW_CAP):
+        super().__init__()
+        self.result = result
+        self.pool = pool
+        self.cap = cap
+        self.rows = list(result.first_rows)
+        self.fetching = False
+        self.error = None
+        self.rowsFetched.connect(self._rows_fetched)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.result.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        value = self.rows[index.row()][index.column()]
+        return "NULL" if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.result.columns[section]
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.result.exhausted and len(self.rows) < self.cap
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.fetching or not self.canFetchMore(parent):
+            return
+        self.fetching = True
+        self.pool.fetch(self.result, min(RESULT_CHUNK_ROWS, self.cap - len(self.rows)), self.rowsFetched.emit)
+
+    def _rows_fetched(self, rows, error):
+        self.fetching = False
+        self.error = error
+        if rows:
+            first = len(self.rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+        self.statusChanged.emit()
+
+    def capped(self) -> bool:
+        return len(self.rows) >= self.cap and not self.result.exhausted
+
+    def status_text(self) -> str:
+        n = len(self.rows)
+        if self.error:
+            return f"{n:,} rows, then error: {self.error}"
+        if self.result.exhausted:
+            return f"{n:,} rows"
+        if self.capped():
+            return f"first {n:,} rows shown (cap); export for the full result"
+        return f"{n:,} rows loaded, scroll for more"
+
+    def close(self):
+        self.pool.close_result(self.result)
+
+
+# -------------------------------------------------
+# PROFILER
+# -------------------------------------------------
+
+SPARK = " ▁▂▃▄▅▆▇█"
+
+
+def sparkline(counts: list[int]) -> str:
+    top = max(counts) or 1
+    return "".join(SPARK[0 if not c else max(1, round(c / top * (len(SPARK) - 1)))] for c in counts)
+
+
+class ProfilerPanel(QWidget):
+    """per-span stats from TRACER; refreshed by a timer while recording"""
+
+    COLUMNS = ("Category", "Name", "Count", "Total ms", "Mean ms", "Max ms", "Histogram (2us .. 32ms+)")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        bar = QHBoxLayout()
+        self.recordChk = QCheckBox("Record")
+        self.categoryBox = QComboBox()
+        self.categoryBox.addItems(["all", "handler", "stmt", "script", "sql", "db", "render", "bridge"])
+        self.clearBtn = QPushButton("Clear")
+        self.exportBtn = QPushButton("Export trace...")
+        bar.addWidget(self.recordChk)
+        bar.addWidget(QLabel("Show:"))
+        bar.addWidget(self.categoryBox)
+        bar.addStretch(1)
+        bar.addWidget(self.clearBtn)
+        bar.addWidget(self.exportBtn)
+        layout.addLayout(bar)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(5, Qt.DescendingOrder)  # slowest first
+        layout.addWidget(self.table)
+        self.categoryBox.currentTextChanged.connect(lambda _: self.refresh())
+
+    def refresh(self):
+        cat = self.categoryBox.currentText()
+        rows = [
+            (c, n, st) for (c, n), st in TRACER.snapshot_stats().items()
+            if cat == "all" or c == cat
+        ]
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(rows))
+        for i, (c, n, (count, total, worst, buckets)) in enumerate(rows):
+            values = (c, n, count, total * 1e3, total / count * 1e3, worst * 1e3, sparkline(buckets))
+            for j, v in enumerate(values):
+                item = QTableWidgetItem()
+                if isinstance(v, float):
+                    item.setData(Qt.DisplayRole, round(v, 3))
+                else:
+                    item.setData(Qt.DisplayRole, v)
+                self.table.setItem(i, j, item)
+        self.table.setSortingEnabled(True)
+
+
+# -------------------------------------------------
+# CARD LIST
+# -------------------------------------------------
+
+CARD_LIST_CHUNK = 1000  # rows handed to the view per fetchMore
+
+
+class CardListModel(QAbstractListModel):
+    """the stack's cards in order, read straight from StackModel.order
+
+    Rows are exposed a chunk at a time as the view scrolls; card_added
+    and the remove pair update single rows instead of rebuilding.
+    """
+
+    def __init__(self, model: StackModel):
+        super().__init__()
+        self.model = model
+        self.loaded = min(CARD_LIST_CHUNK, len(model.order))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        cid = self.model.order.ids[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{cid}: {self.model.cards[cid].name}"
+        if role == Qt.UserRole:
+            return cid
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.model.order)
+
+    def fetchMore(self, parent=QModelIndex()):
+        self._load_to(self.loaded + CARD_LIST_CHUNK)
+
+    def _load_to(self, n: int):
+        n = min(n, len(self.model.order))
+        if n > self.loaded:
+            self.beginInsertRows(QModelIndex(), self.loaded, n - 1)
+            self.loaded = n
+            self.endInsertRows()
+
+    def index_of(self, card_id: int) -> QModelIndex:
+        """the card's row, loading rows up to it if the view hasn't yet"""
+        row = self.model.order.position(card_id)
+        if row is None:
+            return QModelIndex()
+        if row >= self.loaded:
+            self._load_to(row + CARD_LIST_CHUNK)
+        return self.index(row)
+
+    def card_added(self, card_id: int):
+        row = self.model.order.position(card_id)
+        if row is None or row > self.loaded:
+            return  # not loaded yet; canFetchMore covers it
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.loaded += 1
+        self.endInsertRows()
+
+    def begin_remove(self, card_id: int) -> bool:
+        """call before the card leaves StackModel.order, then end_remove()"""
+        row = self.model.order.position(card_id)
+        if row is None or row >= self.loaded:
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.loaded -= 1
+        return True
+
+    def end_remove(self):
+        self.endRemoveRows()
+
+    def reset(self, model: StackModel):
+        self.beginResetModel()
+        self.model = model
+        self.loaded = min(CARD_LIST_CHUNK, len(model.order))
+        self.endResetModel()
+
+
+# -------------------------------------------------
+# CARD PAGE
+# -------------------------------------------------
+# The page is loaded once. Python pushes card state as JSON over the
+# webchannel ("card" replaces the card, "patch" updates/removes single
+# parts, "mode" toggles edit mode) and the renderer below touches only
+# the elements that changed, so field caret and scroll survive updates.
+#
+# Typing is sent back as edit deltas (offset, removed, inserted; offsets
+# in code points) rather than the whole field. Every FIELD_CHECK_EVERY
+# edits and on blur the page sends an adler32 of the field; on mismatch
+# Python answers "resync" and the page sends the full text once.
+
+CARD_PAGE_HTML = r"""
+<!doctype html>
+<html>
+<head>
+<meta charset="utf-8" />
+<style>
+body { margin:0; padding:0; background:#fff; }
+#card { position:relative; width:800px; height:600px; }
+.part { position:absolute; box-sizing:border-box; }
+body.edit .part { outline: 1px dashed #55a; cursor: move; }
+body.edit .part.selected { outline: 2px solid #36f; }
+#marquee { position:absolute; border:1px dashed #36f; background:rgba(51,102,255,0.08); pointer-events:none; }
+.guide { position:absolute; background:#e0a; pointer-events:none; }
+.guide.x { top:0; width:1px; height:100%; }
+.guide.y { left:0; height:1px; width:100%; }
+</style>
+<script src="qrc:///qtwebchannel/qwebchannel.js"></script>
+<script>
+var bridge = null;
+var mode = 'browse';
+var generation = 0;  // of the page state last sent; tags events sent back
+var selected = [];   // part ids selected in edit mode, set by Python
+var FIELD_CHECK_EVERY = 64;
+var SURROGATE = /[\uD800-\uDFFF]/;
+var LOW_SURROGATE = /[\uDC00-\uDFFF]/g;
+
+function partElement(id) {
+    return document.querySelector('#card [data-part-id="' + id + '"]');
+}
+
+function setFieldValue(el, text) {
+    var focused = document.activeElement === el;
+    var start = el.selectionStart, end = el.selectionEnd, top = el.scrollTop;
+    el.value = text;
+    if (focused) {
+        el.setSelectionRange(Math.min(start, text.length), Math.min(end, text.length));
+    }
+    el.scrollTop = top;
+}
+
+// ---- field edit deltas ----
+
+function markSynced(el, text) {
+    el._synced = text;
+    el._astral = SURROGATE.test(text);
+    el._edits = 0;
+}
+
+function codePoints(str) {
+    var low = str.match(LOW_SURROGATE);
+    return str.length - (low ? low.length : 0);
+}
+
+function isHighSurrogate(c) { return c >= 0xD800 && c <= 0xDBFF; }
+function isLowSurrogate(c) { return c >= 0xDC00 && c <= 0xDFFF; }
+
+function textDelta(before, after, caret) {
+    // fast path: the edit ends at the caret and nothing after it changed
+    var end = after.length - caret;
+    var start = Math.min(caret, before.length - end);
+    if (!(end >= 0 && start >= 0 &&
+          before.endsWith(after.substring(caret)) &&
+          after.startsWith(before.substring(0, start)))) {
+        var max = Math.min(before.length, after.length);
+        start = 0;
+        while (start < max && before.charCodeAt(start) === after.charCodeAt(start)) start++;
+        end = 0;
+        while (end < max - start &&
+               before.charCodeAt(before.length - 1 - end) === after.charCodeAt(after.length - 1 - end)) end++;
+    }
+    // never split a surrogate pair
+    if (start > 0 && isHighSurrogate(before.charCodeAt(start - 1))) start--;
+    if (end > 0 && isLowSurrogate(before.charCodeAt(before.length - end))) end--;
+    return {
+        start: start,
+        removed: before.substring(start, before.length - end),
+        inserted: after.substring(start, after.length - end)
+    };
+}
+
+function adler32(str) {
+    var bytes = new TextEncoder().encode(str);
+    var a = 1, b = 0, i = 0, n = bytes.length;
+    while (i < n) {
+        var stop = Math.min(i + 3800, n);
+        for (; i < stop; i++) { a += bytes[i]; b += a; }
+        a %= 65521;
+        b %= 65521;
+    }
+    return ((b * 65536) + a).toString(16);
+}
+
+function sendFieldChecksum(el) {
+    el._edits = 0;
+    bridge.fieldChecksum(generation, parseInt(el.dataset.partId), adler32(el.value), codePoints(el.value));
+}
+
+function sendFieldEdit(el) {
+    var before = el._synced, after = el.value;
+    var d = textDelta(before, after, el.selectionEnd);
+    var offset = d.start, removed = d.removed.length;
+    if (el._astral || SURROGATE.test(d.inserted)) {
+        el._astral = true;
+        offset = codePoints(before.substring(0, d.start));
+        removed = codePoints(d.removed);
+    }
+    bridge.fieldEdited(generation, parseInt(el.dataset.partId), offset, removed, d.inserted);
+    el._synced = after;
+    if (++el._edits >= FIELD_CHECK_EVERY) sendFieldChecksum(el);
+}
+
+function resyncField(id) {
+    var el = partElement(id);
+    if (!el) return;
+    bridge.fieldChanged(generation, id, el.value);
+    markSynced(el, el.value);
+}
+
+function updatePart(el, p) {
+    el.style.left = p.x + 'px';
+    el.style.top = p.y + 'px';
+    el.style.width = p.width + 'px';
+    el.style.height = p.height + 'px';
+    if (p.type === 'field') {
+        if (el.value !== p.text) setFieldValue(el, p.text);
+        if (el._synced !== p.text) markSynced(el, p.text);
+        el.readOnly = !!p.lockText;
+    } else if (el.textContent !== p.text) {
+        el.textContent = p.text;
+    }
+}
+
+function buildPart(p) {
+    var el;
+    if (p.type === 'button') {
+        el = document.createElement('button');
+    } else if (p.type === 'field') {
+        el = document.createElement('textarea');
+    } else {
+        return null;
+    }
+    el.className = 'part ' + p.type;
+    if (selected.indexOf(p.id) >= 0) el.classList.add('selected');
+    el.dataset.partId = p.id;
+    el.dataset.type = p.type;
+    updatePart(el, p);
+    return el;
+}
+
+function setMode(m) {
+    mode = m;
+    document.body.classList.toggle('edit', m === 'edit');
+}
+
+// a layer update is {parts} to replace the layer or {upsert, remove} to patch it
+function updateLayer(layer, u) {
+    if (!u) return;
+    if (u.parts) {
+        var els = [];
+        u.parts.forEach(function(p) {
+            var el = buildPart(p);
+            if (el) els.push(el);
+        });
+        layer.replaceChildren.apply(layer, els);
+        return;
+    }
+    u.remove.forEach(function(id) {
+        var el = partElement(id);
+        if (el) el.remove();
+    });
+    u.upsert.forEach(function(p) {
+        var el = partElement(p.id);
+        if (el && el.dataset.type === p.type) {
+            updatePart(el, p);
+            return;
+        }
+        var fresh = buildPart(p);
+        if (!fresh) return;
+        if (el) el.replaceWith(fresh); else layer.appendChild(fresh);
+    });
+}
+
+function renderCard(msg) {
+    document.getElementById('card').dataset.cardId = msg.cardId;
+    selected = msg.selected || [];
+    patchCard(msg);
+    setMode(msg.mode);
+}
+
+function patchCard(msg) {
+    // the background layer sits under the card layer and is kept across cards
+    updateLayer(document.getElementById('bg'), msg.bg);
+    updateLayer(document.getElementById('fg'), msg.card);
+}
+
+// ---- edit mode: selection, marquee, drag with snap guides ----
+
+var drag = null;     // ids, elements, start positions and bounding box of the parts being dragged
+var marquee = null;
+var justDragged = false;
+
+function cardPoint(e) {
+    var r = document.getElementById('card').getBoundingClientRect();
+    return {x: Math.round(e.clientX - r.left), y: Math.round(e.clientY - r.top)};
+}
+
+function setSelection(ids) {
+    document.querySelectorAll('#card .part.selected').forEach(function(el) {
+        el.classList.remove('selected');
+    });
+    selected = ids;
+    ids.forEach(function(id) {
+        var el = partElement(id);
+        if (el) el.classList.add('selected');
+    });
+}
+
+function marqueeRect() {
+    var a = marquee.start, b = marquee.end;
+    return [Math.min(a.x, b.x), Math.min(a.y, b.y), Math.max(a.x, b.x), Math.max(a.y, b.y)];
+}
+
+function placeMarquee() {
+    var r = marqueeRect();
+    marquee.el.style.left = r[0] + 'px';
+    marquee.el.style.top = r[1] + 'px';
+    marquee.el.style.width = (r[2] - r[0]) + 'px';
+    marquee.el.style.height = (r[3] - r[1]) + 'px';
+}
+
+function placeDrag() {
+    var dx = drag.dx + drag.snapX, dy = drag.dy + drag.snapY;
+    drag.els.forEach(function(el, i) {
+        el.style.left = (drag.origin[i][0] + dx) + 'px';
+        el.style.top = (drag.origin[i][1] + dy) + 'px';
+    });
+}
+
+function showGuides(lines) {
+    var layer = document.getElementById('guides');
+    layer.replaceChildren.apply(layer, lines.map(function(l) {
+        var el = document.createElement('div');
+        el.className = 'guide ' + l[0];
+        if (l[0] === 'x') el.style.left = l[1] + 'px'; else el.style.top = l[1] + 'px';
+        return el;
+    }));
+}
+
+function snapDrag(msg) {
+    // Python's answer to the last dragProbe: offset to the nearest guides
+    if (!drag) return;
+    drag.snapX = msg.dx;
+    drag.snapY = msg.dy;
+    placeDrag();
+    showGuides(msg.lines);
+}
+
+function onPageUpdate(text) {
+    var msg = JSON.parse(text);
+    if (msg.gen !== undefined) generation = msg.gen;
+    if (msg.op === 'card') renderCard(msg);
+    else if (msg.op === 'patch') patchCard(msg);
+    else if (msg.op === 'mode') setMode(msg.mode);
+    else if (msg.op === 'resync') resyncField(msg.partId);
+    else if (msg.op === 'select') setSelection(msg.ids);
+    else if (msg.op === 'guides') snapDrag(msg);
+}
+
+new QWebChannel(qt.webChannelTransport, function(channel) {
+    bridge = channel.objects.pybridge;
+    bridge.pageUpdate.connect(onPageUpdate);
+
+    document.addEventListener('click', function(e) {
+        if (justDragged) {  // the click that ends a drag doesn't reselect
+            justDragged = false;
+            return;
+        }
+        var t = e.target;
+        if (t && t.dataset && t.dataset.partId) {
+            bridge.partClicked(generation, parseInt(t.dataset.partId));
+        }
+    });
+    document.addEventListener('input', function(e) {
+        var t = e.target;
+        if (t && t.dataset && t.dataset.partId && t.tagName.toLowerCase() === 'textarea') {
+            sendFieldEdit(t);
+        }
+    });
+    document.addEventListener('focusout', function(e) {
+        var t = e.target;
+        if (t && t.dataset && t.dataset.partId && t.tagName.toLowerCase() === 'textarea' && t._edits) {
+            sendFieldChecksum(t);
+        }
+    });
+
+    // edit mode: drag the selection (or the part under the mouse), or
+    // draw a marquee from an empty spot
+    document.addEventListener('mousedown', function(e) {
+        if (mode !== 'edit') return;
+        var t = e.target, pt = cardPoint(e);
+        if (t && t.dataset && t.dataset.partId) {
+            var id = parseInt(t.dataset.partId);
+            var ids = selected.indexOf(id) >= 0 ? selected : [id];
+            var els = [], origin = [], box = [Infinity, Infinity, -Infinity, -Infinity];
+            ids.forEach(function(pid) {
+                var el = partElement(pid);
+                if (!el) return;
+                els.push(el);
+                origin.push([el.offsetLeft, el.offsetTop]);
+                box = [Math.min(box[0], el.offsetLeft), Math.min(box[1], el.offsetTop),
+                       Math.max(box[2], el.offsetLeft + el.offsetWidth),
+                       Math.max(box[3], el.offsetTop + el.offsetHeight)];
+            });
+            drag = {ids: ids, els: els, origin: origin, box: box, start: pt, dx: 0, dy: 0, snapX: 0, snapY: 0};
+        } else {
+            var el = document.createElement('div');
+            el.id = 'marquee';
+            document.getElementById('card').appendChild(el);
+            marquee = {el: el, start: pt, end: pt};
+            placeMarquee();
+        }
+        e.preventDefault();
+    });
+
+    document.addEventListener('mousemove', function(e) {
+        var pt = cardPoint(e);
+        if (drag) {
+            drag.dx = pt.x - drag.start.x;
+            drag.dy = pt.y - drag.start.y;
+            placeDrag();
+            var b = drag.box;
+            bridge.dragProbe(generation, JSON.stringify(drag.ids),
+                             b[0] + drag.dx, b[1] + drag.dy, b[2] + drag.dx, b[3] + drag.dy);
+        } else if (marquee) {
+            marquee.end = pt;
+            placeMarquee();
+        }
+    });
+
+    document.addEventListener('mouseup', function(e) {
+        if (drag) {
+            if (drag.dx || drag.dy) {
+                bridge.partsMoved(generation, JSON.stringify(drag.ids), drag.dx, drag.dy);
+                justDragged = true;
+            }
+            showGuides([]);
+            drag = null;
+        } else if (marquee) {
+            var r = marqueeRect();
+            marquee.el.remove();
+            marquee = null;
+            bridge.marqueeSelected(generation, r[0], r[1], r[2], r[3]);
+        }
+    });
+
+    bridge.pageReady();
+});
+</script>
+</head>
+<body>
+<div id="card"><div id="bg"></div><div id="fg"></div><div id="guides"></div></div>
+</body>
+</html>
+"""
+
+
+def layer_patch(rendered: dict, view: list[dict]) -> tuple[dict | None, dict]:
+    """page update turning rendered (id -> state) into view, and the new rendered map"""
+    states = {p["id"]: p for p in view}
+    upsert = [p for p in view if rendered.get(p["id"]) != p]
+    remove = [pid for pid in rendered if pid not in states]
+    return ({"upsert": upsert, "remove": remove} if upsert or remove else None), states
+
+
+# -------------------------------------------------
+# MAIN WINDOW
+# -------------------------------------------------
+
+class MainWindow(QMainWindow, StackSession):
+    def __init__(self, db: RuntimeDb):
+        super().__init__()
+        self.db = db
+        self.conn = db.writer
+        self.setWindowTitle("HyperCard Lite")
+        self.mode = "browse"
+        self.selected_part_id = None
+        self.selection = []            # part ids selected in edit mode
+
+        # userland DB, queried from worker threads
+        self.sql_pool = UserSqlPool()
+        self.sql_jobs = set()
+        self.sql_relay = SqlResultRelay()
+        self.sql_relay.finished.connect(self.sql_job_finished)
+
+        self.start_session(StackModel(self.conn, reader=db.reader))
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.timeout.connect(self.flush_model)
+        self.flush_deadline = None
+        self.card_cache = CardSnapshotCache(self.model)
+
+        self.view = QWebEngineView()
+        self.setCentralWidget(self.view)
+
+        self.channel = QWebChannel()
+        self.bridge = Bridge(self)
+        self.channel.registerObject("pybridge", self.bridge)
+        self.view.page().setWebChannel(self.channel)
+
+        # state last sent to the page, diffed by push_card_state
+        self.page_ready = False
+        self.page_generation = 0       # bumped when the page gets a new card or mode
+        self.rendered_card_id = None
+        self.rendered_parts = {}       # card layer
+        self.rendered_bg_id = None
+        self.rendered_bg_view = None   # the BackgroundLayer.view the page has
+        self.rendered_bg = {}          # background layer
+        self.view.setHtml(CARD_PAGE_HTML, QUrl("qrc:///"))
+
+        self.cardDock = QDockWidget("Cards", self)
+        cardPanel = QWidget()
+        cardLayout = QVBoxLayout(cardPanel)
+        cardLayout.setContentsMargins(0, 0, 0, 0)
+        self.searchEdit = QLineEdit()
+        self.searchEdit.setPlaceholderText("Find in cards (Enter for next)")
+        self.searchEdit.setClearButtonEnabled(True)
+        self.searchEdit.returnPressed.connect(self.search_cards)
+        cardLayout.addWidget(self.searchEdit)
+        self.cardListModel = CardListModel(self.model)
+        self.cardList = QListView()
+        self.cardList.setUniformItemSizes(True)
+        self.cardList.setModel(self.cardListModel)
+        cardLayout.addWidget(self.cardList)
+        self.cardDock.setWidget(cardPanel)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.cardDock)
+        self.cardList.clicked.connect(self._card_clicked)
+
+        self.propDock = QDockWidget("Properties", self)
+        self.propPanel = PartPropertyPanel()
+        self.propDock.setWidget(self.propPanel)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.propDock)
+        self.propPanel.apply_btn.clicked.connect(self.apply_part_changes)
+
+        self.dataDock = QDockWidget("Data Output", self)
+        dataPanel = QWidget()
+        dataLayout = QVBoxLayout(dataPanel)
+        dataLayout.setContentsMargins(0, 0, 0, 0)
+        self.sqlStatus = QWidget()
+        statusLayout = QHBoxLayout(self.sqlStatus)
+        statusLayout.setContentsMargins(4, 2, 4, 2)
+        self.sqlStatusLabel = QLabel()
+        self.sqlBusy = QProgressBar()
+        self.sqlBusy.setRange(0, 0)
+        self.sqlBusy.setMaximumWidth(120)
+        self.sqlCancelBtn = QPushButton("Cancel")
+        self.sqlCancelBtn.clicked.connect(self.cancel_user_sql)
+        statusLayout.addWidget(self.sqlStatusLabel)
+        statusLayout.addWidget(self.sqlBusy)
+        statusLayout.addStretch(1)
+        statusLayout.addWidget(self.sqlCancelBtn)
+        self.sqlStatus.hide()
+        dataLayout.addWidget(self.sqlStatus)
+        self.dataText = QTextEdit()
+        self.dataText.setReadOnly(True)
+        dataLayout.addWidget(self.dataText)
+        self.resultBar = QWidget()
+        resultLayout = QHBoxLayout(self.resultBar)
+        resultLayout.setContentsMargins(4, 2, 4, 2)
+        self.resultLabel = QLabel()
+        exportCsvBtn = QPushButton("Export CSV...")
+        exportCsvBtn.clicked.connect(lambda: self.export_result("csv"))
+        exportJsonlBtn = QPushButton("Export JSONL...")
+        exportJsonlBtn.clicked.connect(lambda: self.export_result("jsonl"))
+        resultLayout.addWidget(self.resultLabel)
+        resultLayout.addStretch(1)
+        resultLayout.addWidget(exportCsvBtn)
+        resultLayout.addWidget(exportJsonlBtn)
+        dataLayout.addWidget(self.resultBar)
+        self.resultView = QTableView()
+        dataLayout.addWidget(self.resultView)
+        self.resultModel = None
+        self.resultBar.hide()
+        self.resultView.hide()
+        self.dataDock.setWidget(dataPanel)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.dataDock)
+
+        self.profilerDock = QDockWidget("Profiler", self)
+        self.profiler = ProfilerPanel()
+        self.profiler.recordChk.toggled.connect(self.set_tracing)
+        self.profiler.clearBtn.clicked.connect(self.clear_trace)
+        self.profiler.exportBtn.clicked.connect(self.export_trace)
+        self.profilerDock.setWidget(self.profiler)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.profilerDock)
+        self.tabifyDockWidget(self.dataDock, self.profilerDock)
+        self.dataDock.raise_()
+        self.profilerTimer = QTimer(self)
+        self.profilerTimer.timeout.connect(self.profiler.refresh)
+
+        self._build_menus()
+
+        self.render_current_card()
+
+    # ---------------- menus ----------------
+    def _build_menus(self):
+        mode_menu = self.menuBar().addMenu("Mode")
+        browse_act = QAction("Browse", self)
+        browse_act.triggered.connect(lambda: self.set_mode("browse"))
+        mode_menu.addAction(browse_act)
+
+        edit_act = QAction("Edit", self)
+        edit_act.triggered.connect(lambda: self.set_mode("edit"))
+        mode_menu.addAction(edit_act)
+
+        card_menu = self.menuBar().addMenu("Card")
+
+        new_card_act = QAction("New card", self)
+        new_card_act.triggered.connect(self.create_new_card)
+        card_menu.addAction(new_card_act)
+
+        del_card_act = QAction("Delete current card", self)
+        del_card_act.triggered.connect(self.delete_current_card)
+        card_menu.addAction(del_card_act)
+
+        edit_card_act = QAction("Edit card script...", self)
+        edit_card_act.triggered.connect(self.edit_card_script)
+        card_menu.addAction(edit_card_act)
+
+        select_menu = self.menuBar().addMenu("Select")
+
+        select_all_act = QAction("All parts", self)
+        select_all_act.triggered.connect(self.select_all_parts)
+        select_menu.addAction(select_all_act)
+
+        select_overlap_act = QAction("Overlapping parts", self)
+        select_overlap_act.triggered.connect(self.select_overlapping_parts)
+        select_menu.addAction(select_overlap_act)
+
+        insert_menu = self.menuBar().addMenu("Insert")
+
+        add_btn_act = QAction("Button", self)
+        add_btn_act.triggered.connect(self.add_button_to_current_card)
+        insert_menu.addAction(add_btn_act)
+
+        add_field_act = QAction("Field", self)
+        add_field_act.triggered.connect(self.add_field_to_current_card)
+        insert_menu.addAction(add_field_act)
+
+        tools_menu = self.menuBar().addMenu("Tools")
+
+        cache_stats_act = QAction("Script cache stats", self)
+        cache_stats_act.triggered.connect(self.show_script_cache_stats)
+        tools_menu.addAction(cache_stats_act)
+        tools_menu.addAction(self.profilerDock.toggleViewAction())
+
+        tools_menu.addSeparator()
+        export_stack_act = QAction("Export stack...", self)
+        export_stack_act.triggered.connect(self.export_stack_file)
+        tools_menu.addAction(export_stack_act)
+
+        import_stack_act = QAction("Import stack...", self)
+        import_stack_act.triggered.connect(self.import_stack_file)
+        tools_menu.addAction(import_stack_act)
+
+    # ---------------- mode ----------------
+    def set_mode(self, mode: str):
+        self.mode = mode
+        self.statusBar().showMessage(f"Mode: {mode}", 2000)
+        self.page_generation += 1
+        self.send_page_message({"op": "mode", "mode": mode, "gen": self.page_generation})
+
+    # ---------------- script API (the rest is StackSession) ----------------
+    def render_pending_view(self):
+        if self.render_pending:
+            self.render_current_card()
+
+    def show_status(self, text: str):
+        self.statusBar().showMessage(text, 5000)
+
+    def answer(self, text: str):
+        out = self.expand_vars(text)
+        # the dialog is modal; show the card as it is so far behind it
+        self.render_pending_view()
+        QMessageBox.information(self, "Message", out)
+
+    def run_user_sql(self, query: str, into: str | None, params: tuple = (), many: list | None = None):
+        job = SqlJob(query, into, params, many)
+        # the handler stops here and continues in sql_job_finished
+        job.continuation = self.runtime.suspend()
+        self.sql_jobs.add(job)
+        self.update_sql_status()
+        self.sql_pool.submit(job, self.sql_relay.finished.emit)
+
+    def sql_job_finished(self, job: SqlJob):
+        self.sql_jobs.discard(job)
+        self.update_sql_status()
+        if job.error:
+            self.show_data_output(f"SQL error: {job.error}")
+        elif job.export:
+            self.statusBar().showMessage(f"Exported {job.result:,} rows to {job.export[0]}", 5000)
+        elif job.into:
+            job.continuation.vars[job.into] = job.result
+        elif isinstance(job.result, ResultCursor):
+            self.show_result_grid(job.result)
+        if job.continuation is not None and not job.cancelled:
+            self.runtime.resume(job.continuation)
+
+    def cancel_user_sql(self):
+        for job in list(self.sql_jobs):
+            self.sql_pool.cancel(job)
+
+    def update_sql_status(self):
+        n = len(self.sql_jobs)
+        if n:
+            self.sqlStatusLabel.setText("Running query..." if n == 1 else f"Running {n} queries...")
+        self.sqlStatus.setVisible(bool(n))
+
+    def show_data_output(self, text: str):
+        self.dataText.setPlainText(text)
+        self.resultBar.hide()
+        self.resultView.hide()
+        self.dataText.show()
+        self.dataDock.raise_()
+
+    def show_result_grid(self, result: ResultCursor):
+        if self.resultModel is not None:
+            self.resultModel.close()
+        self.resultModel = SqlResultModel(result, self.sql_pool)
+        self.resultModel.statusChanged.connect(self.update_result_label)
+        self.resultView.setModel(self.resultModel)
+        self.update_result_label()
+        self.dataText.hide()
+        self.resultBar.show()
+        self.resultView.show()
+        self.dataDock.raise_()
+
+    def update_result_label(self):
+        if self.resultModel is not None:
+            self.resultLabel.setText(self.resultModel.status_text())
+
+    def export_result(self, fmt: str):
+        if self.resultModel is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export result", f"result.{fmt}")
+        if not path:
+            return
+        result = self.resultModel.result
+        job = SqlJob(result.query, None, result.params, budget=float("inf"))
+        job.export = (path, fmt)
+        self.sql_jobs.add(job)
+        self.update_sql_status()
+        self.sql_pool.submit(job, self.sql_relay.finished.emit)
+
+    def show_script_cache_stats(self):
+        st = self.runtime.cache.stats()
+        self.show_data_output(
+            f"Script cache: {st['entries']}/{st['max_size']} entries, "
+            f"{st['hits']} hits, {st['misses']} misses, hit rate {st['hit_rate']:.1%}"
+        )
+
+    # ---------------- profiler ----------------
+    def set_tracing(self, on: bool):
+        TRACER.enabled = on
+        if on:
+            self.profilerTimer.start(500)
+        else:
+            self.profilerTimer.stop()
+            self.profiler.refresh()
+
+    def clear_trace(self):
+        TRACER.clear()
+        self.profiler.refresh()
+
+    def export_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export trace", "trace.json", "Chrome trace (*.json)")
+        if not path:
+            return
+        try:
+            n = TRACER.export(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Export trace", str(e))
+            return
+        self.statusBar().showMessage(f"Wrote {n} trace events to {path} (open in chrome://tracing or Perfetto)", 5000)
+
+    # ---------------- stack files ----------------
+    def export_stack_file(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export stack", "stack.jsonl", "Stack files (*.jsonl)")
+        if not path:
+            return
+        self.flush_model()
+        try:
+            n = export_stack(self.conn, path)
+        except (OSError, sqlite3.Error) as e:
+            QMessageBox.warning(self, "Export stack", str(e))
+            return
+        self.statusBar().showMessage(f"Exported {n} rows to {path}", 5000)
+
+    def import_stack_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import stack", "", "Stack files (*.jsonl)")
+        if not path:
+            return
+        self.flush_model()
+        try:
+            n = import_stack(self.conn, path)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            QMessageBox.warning(self, "Import stack", str(e))
+            return
+        self.db.changed()
+        self.reload_stack()
+        self.statusBar().showMessage(f"Imported {n} rows from {path}", 5000)
+
+    def reload_stack(self):
+        self.model = StackModel(self.conn, reader=self.db.reader)
+        self.card_cache = CardSnapshotCache(self.model)
+        self.runtime.cache.clear()
+        self.selected_part_id = None
+        self.selection = []
+        self.current_card_id = self.model.first_card_id()
+        self.cardListModel.reset(self.model)
+        self.render_current_card()
+
+    # ---------------- bridge handlers ----------------
+    def handle_part_clicked(self, part_id: int):
+        if self.mode == "edit":
+            self.select_parts([part_id])
+            return
+
+        self.click_part(self.model.part(part_id))
+
+    def handle_field_changed(self, part_id: int, new_text: str):
+        part = self.model.part(part_id)
+        if part:
+            self.model.set_part_props(part, text=new_text)
+            self.part_changed(part)
+            self.note_page_edit(part_id, text=new_text)
+
+    def handle_field_edited(self, part_id: int, edits: list[tuple[int, int, str]]):
+        part = self.model.part(part_id)
+        if not part:
+            return
+        text = part.text or ""
+        for offset, removed, inserted in edits:
+            text = apply_text_delta(text, offset, removed, inserted)
+            if text is None:
+                self.send_page_message({"op": "resync", "partId": part_id})
+                return
+        self.handle_field_changed(part_id, text)
+
+    def handle_field_checksum(self, part_id: int, checksum: str, length: int):
+        part = self.model.part(part_id)
+        if not part:
+            return
+        text = part.text or ""
+        if len(text) != length or field_checksum(text) != checksum:
+            self.send_page_message({"op": "resync", "partId": part_id})
+
+    def handle_parts_moved(self, part_ids: tuple[int, ...], dx: int, dy: int):
+        # the drop is snapped again here; the render patch sends the final positions
+        parts = [p for p in map(self.model.part, part_ids) if p is not None]
+        if not parts:
+            return
+        rects = [part_rect(p) for p in parts]
+        box = (min(r[0] for r in rects) + dx, min(r[1] for r in rects) + dy,
+               max(r[2] for r in rects) + dx, max(r[3] for r in rects) + dy)
+        sdx, sdy, _ = self.model.snap_rect(self.model.card(self.current_card_id), box, set(part_ids))
+        for part, rect in zip(parts, rects):
+            self.model.set_part_props(part, x=rect[0] + dx + sdx, y=rect[1] + dy + sdy)
+            self.part_changed(part)
+        part = self.model.part(self.selected_part_id) if self.selected_part_id in part_ids else None
+        if part is not None:
+            self.propPanel.set_part_data(part.id, part.type, part.name, part.props, part.script)
+        self.render_current_card()
+
+    def handle_drag_probe(self, part_ids: tuple[int, ...], rect: tuple[int, int, int, int]):
+        dx, dy, guides = self.model.snap_rect(self.model.card(self.current_card_id), rect, set(part_ids))
+        self.send_page_message({"op": "guides", "dx": dx, "dy": dy, "lines": guides})
+
+    def handle_marquee_selected(self, rect: tuple[int, int, int, int]):
+        # an empty marquee (a click on no part) clears the selection
+        parts = []
+        if rect[0] < rect[2] and rect[1] < rect[3]:
+            parts = self.model.parts_in_rect(self.model.card(self.current_card_id), rect)
+        self.select_parts([p.id for p in parts])
+
+    # ---------------- selection (edit mode) ----------------
+    def select_parts(self, part_ids: list[int]):
+        """the topmost selected part is the one shown in Properties"""
+        self.selection = part_ids
+        self.selected_part_id = part_ids[-1] if part_ids else None
+        if self.selected_part_id is not None:
+            self.load_part_into_panel(self.selected_part_id)
+        self.send_page_message({"op": "select", "ids": part_ids})
+
+    def select_all_parts(self):
+        card = self.model.card(self.current_card_id)
+        self.set_mode("edit")
+        self.select_parts([p.id for p in self.model.parts_for_card(card)])
+
+    def select_overlapping_parts(self):
+        part = self.model.part(self.selected_part_id) if self.selected_part_id is not None else None
+        if part is None:
+            self.statusBar().showMessage("Select a part first", 3000)
+            return
+        card = self.model.card(self.current_card_id)
+        others = self.model.overlapping_parts(card, part)
+        self.select_parts([p.id for p in others] + [part.id])
+        self.statusBar().showMessage(f"{len(others)} parts overlap {part.name}", 3000)
+
+    # ---------------- persistence ----------------
+    def part_changed(self, part: Part):
+        self.card_cache.invalidate_part(part)
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        # coalesce: keystrokes and drags keep pushing the flush back until
+        # input goes idle, bounded by FLUSH_MAX_DELAY_MS from the first edit
+        now = time.monotonic()
+        if self.flush_deadline is None:
+            self.flush_deadline = now + FLUSH_MAX_DELAY_MS / 1000
+        remaining = max(0, int((self.flush_deadline - now) * 1000))
+        self.flush_timer.start(min(FLUSH_IDLE_MS, remaining))
+
+    def flush_model(self):
+        self.flush_timer.stop()
+        self.flush_deadline = None
+        if self.model.flush():
+            self.db.changed()
+
+    def closeEvent(self, event):
+        self.cancel_user_sql()
+        if self.resultModel is not None:
+            self.resultModel.close()
+        self.sql_pool.shutdown()
+        self.flush_model()
+        self.db.close()
+        super().closeEvent(event)
+
+    # ---------------- properties ----------------
+    def load_part_into_panel(self, part_id: int):
+        part = self.model.part(part_id)
+        if not part:
+            return
+        self.propPanel.set_part_data(part_id, part.type, part.name, part.props, part.script)
+
+    def apply_part_changes(self):
+        data = self.propPanel.collect_data()
+        if not data["part_id"]:
+            return
+        part = self.model.part(data["part_id"])
+        if not part:
+            return
+        if part.script != data["script"]:
+            self.runtime.cache.invalidate(part.script)
+        props = {
+            "x": data["x"],
+            "y": data["y"],
+            "width": data["width"],
+            "height": data["height"],
+            "text": data["text"],
+            "lockText": data["lockText"],
+        }
+        self.model.update_part(part, data["name"], {**part.props, **props}, data["script"])
+        self.part_changed(part)
+        self.render_current_card()
+
+    # ---------------- card list ----------------
+    def _card_clicked(self, index: QModelIndex):
+        self.go_to_card(index.data(Qt.UserRole))
+
+    def search_cards(self):
+        # the search box also looks at part names and scripts
+        text = self.searchEdit.text()
+        cid = self.find_card(text, "text name script")
+        if cid is None:
+            if text.strip():
+                self.statusBar().showMessage(f"Not found: {text}", 3000)
+            return
+        if cid != self.current_card_id:
+            self.go_to_card(cid)
+
+    # ---------------- rendering ----------------
+    @traced("render")
+    def render_current_card(self):
+        self.render_pending = False
+        snap = self.card_cache.get(self.current_card_id)
+        if snap.card.id != self.rendered_card_id:
+            self.selected_part_id = None
+            self.selection = []
+        self.push_card_state(snap)
+        self.setWindowTitle(f"HyperCard Lite - {snap.card.name}")
+
+        self.cardList.setCurrentIndex(self.cardListModel.index_of(snap.card.id))
+
+        # warm the neighbours while the user reads this card
+        QTimer.singleShot(0, self.prefetch_neighbour_cards)
+
+    def prefetch_neighbour_cards(self):
+        cid = self.current_card_id
+        for nid in (self.model.next_card_id(cid), self.model.prev_card_id(cid)):
+            if nid != cid:
+                self.card_cache.prefetch(nid)
+
+    def push_card_state(self, snap: CardSnapshot):
+        """send the card to the page: the card layer whole on navigation, else
+        only changed parts; the background layer only when it is another
+        background or was rebuilt since it was sent"""
+        card_id = snap.card.id
+        layer = snap.bg_layer
+        msg = {"op": "patch", "cardId": card_id}
+        if layer.background_id != self.rendered_bg_id:
+            msg["bg"] = {"parts": layer.view}
+            self.rendered_bg = {p["id"]: p for p in layer.view}
+        elif layer.view is not self.rendered_bg_view:
+            msg["bg"], self.rendered_bg = layer_patch(self.rendered_bg, layer.view)
+        if card_id != self.rendered_card_id:
+            self.page_generation += 1
+            msg.update(op="card", mode=self.mode, gen=self.page_generation, selected=self.selection,
+                       card={"parts": snap.view})
+            self.rendered_parts = {p["id"]: p for p in snap.view}
+        else:
+            msg["card"], self.rendered_parts = layer_patch(self.rendered_parts, snap.view)
+        self.rendered_card_id = card_id
+        self.rendered_bg_id = layer.background_id
+        self.rendered_bg_view = layer.view
+        if msg["op"] == "patch" and not msg.get("bg") and not msg.get("card"):
+            return
+        self.send_page_message(msg)
+
+    def send_page_message(self, msg: dict):
+        # before the page has connected its webchannel, handle_page_ready
+        # sends the full state instead
+        if self.page_ready:
+            self.bridge.pageUpdate.emit(json.dumps(msg))
+
+    def note_page_edit(self, part_id: int, **changes):
+        # the page made this change itself; record it so it isn't echoed back
+        for rendered in (self.rendered_parts, self.rendered_bg):
+            state = rendered.get(part_id)
+            if state is not None:
+                rendered[part_id] = {**state, **changes}
+
+    def handle_page_ready(self):
+        self.page_ready = True
+        self.page_generation += 1
+        self.send_page_message({
+            "op": "card",
+            "cardId": self.rendered_card_id,
+            "mode": self.mode,
+            "gen": self.page_generation,
+            "selected": self.selection,
+            "bg": {"parts": list(self.rendered_bg.values())},
+            "card": {"parts": list(self.rendered_parts.values())},
+        })
+
+    # ---------------- add/remove cards & parts ----------------
+    def create_new_card(self):
+        card = self.model.card(self.current_card_id)
+        if not card:
+            return
+        new_card = self.model.add_card(card.stack_id, card.background_id)
+        self.cardListModel.card_added(new_card.id)
+        self.go_to_card(new_card.id)
+
+    def delete_current_card(self):
+        if len(self.model.card_ids()) <= 1:
+            QMessageBox.warning(self, "Delete card", "You can't delete the last card.")
+            return
+        cid = self.current_card_id
+        removing = self.cardListModel.begin_remove(cid)
+        self.model.delete_card(cid)
+        if removing:
+            self.cardListModel.end_remove()
+        self.card_cache.drop(cid)
+        self.flush_model()
+        self.current_card_id = self.model.first_card_id()
+        self.render_current_card()
+
+    def add_button_to_current_card(self):
+        card = self.model.card(self.current_card_id)
+        if not card:
+            return
+        props = {"x": 40, "y": 40, "width": 120, "height": 30, "text": "New Button"}
+        script = """on click
+answer "Button clicked"
+end click"""
+        part = self.model.add_part(card.id, "button", "NewButton", props, script)
+        self.part_changed(part)
+        self.render_current_card()
+
+    def add_field_to_current_card(self):
+        card = self.model.card(self.current_card_id)
+        if not card:
+            return
+        props = {"x": 40, "y": 90, "width": 200, "height": 80, "text": "New field", "lockText": False}
+        part = self.model.add_part(card.id, "field", "NewField", props, "")
+        self.part_changed(part)
+        self.render_current_card()
+
+    def edit_card_script(self):
+        card = self.model.card(self.current_card_id)
+        if not card:
+            return
+        card_name, card_script = card.name, card.script
+
+        dlg = QDialog(self)
+        dlg.setWindowTitle(f"Edit script for {card_name}")
+        layout = QVBoxLayout(dlg)
+        edit = QTextEdit()
+        edit.setPlainText(card_script or "")
+        layout.addWidget(edit)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        layout.addWidget(buttons)
+        buttons.accepted.connect(dlg.accept)
+        buttons.rejected.connect(dlg.reject)
+
+        if dlg.exec() == QDialog.Accepted:
+            new_script = edit.toPlainText()
+            if new_script != card_script:
+                self.runtime.cache.invalidate(card_script)
+            self.model.set_card_script(card, new_script)
+            self.card_cache.invalidate_card(card.id)
+            self.schedule_flush()
+            QMessageBox.information(self, "Card script", "Card script saved.")
+
+
+# -------------------------------------------------
+# MAIN
+# -------------------------------------------------
+
+def main():
+    app = QApplication(sys.argv)
+    win = MainWindow(RuntimeDb(DB_PATH))
+    win.resize(1200, 700)
+    win.show()
+    sys.exit(app.exec())
+
+
+if __name__ == "__main__":
+    main()
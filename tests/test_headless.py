@@ -0,0 +1,24 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import hypercard_engine as hc  # noqa: E402
+
+
+def test_run_missing_stack(tmp_path):
+    path = str(tmp_path / "typo.db")
+    with pytest.raises(SystemExit) as e:
+        hc.cli_main([path, "--click", "NextButton"])
+    assert e.value.code == 2
+    assert not os.path.exists(path)
+
+
+def test_open_stack_does_not_create(tmp_path):
+    path = str(tmp_path / "typo.db")
+    with pytest.raises(sqlite3.OperationalError):
+        hc.open_stack(path)
+    assert not os.path.exists(path)
@@ -0,0 +1,66 @@
+import math
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import hypercard_engine as hc  # noqa: E402
+
+
+def run(query, values):
+    sql, params = hc.compile_sql_placeholders(query)
+    conn = sqlite3.connect(":memory:")
+    return conn.execute(sql, hc.bind_sql_params(params, values)).fetchone()
+
+
+def test_quoted_placeholder_binds_text():
+    assert hc.compile_sql_placeholders("SELECT '{n}'") == ("SELECT ?", (("n", True),))
+    assert run("SELECT '{n}'", {"n": "007"}) == ("007",)
+
+
+def test_placeholder_inside_literal_is_concatenated():
+    sql, params = hc.compile_sql_placeholders("SELECT 'a{n}b{m}'")
+    assert sql == "SELECT ('a' || ? || 'b' || ?)"
+    assert params == (("n", True), ("m", True))
+    assert run("SELECT 'a{n}b{m}'", {"n": "x", "m": "y"}) == ("axby",)
+
+
+def test_escaped_quote_stays_in_literal():
+    sql, params = hc.compile_sql_placeholders("SELECT 'it''s {n}', {m}")
+    assert sql == "SELECT ('it''s ' || ?), ?"
+    assert params == (("n", True), ("m", False))
+    assert run("SELECT 'it''s {n}', {m}", {"n": "o'k", "m": "2"}) == ("it's o'k", 2)
+
+
+@pytest.mark.parametrize("query", [
+    'SELECT 1 AS "{x}", {y}',
+    "SELECT 1 AS [{x}], {y}",
+    "SELECT 1 AS `{x}`, {y}",
+    "SELECT 1, -- {x}\n{y}",
+    "SELECT 1, /* {x} */ {y}",
+])
+def test_identifiers_and_comments_are_left_alone(query):
+    sql, params = hc.compile_sql_placeholders(query)
+    assert "{x}" in sql
+    assert params == (("y", False),)
+    assert run(query, {"x": "no", "y": "5"}) == (1, 5)
+
+
+def test_placeholder_cannot_name_a_table():
+    sql, params = hc.compile_sql_placeholders("SELECT * FROM {tbl}")
+    assert sql == "SELECT * FROM ?"
+    with pytest.raises(sqlite3.OperationalError):
+        run("SELECT * FROM {tbl}", {"tbl": "t"})
+
+
+def test_sql_param_value_coercion():
+    assert hc.sql_param_value("007", False) == 7
+    assert hc.sql_param_value(" 2.5 ", False) == 2.5
+    assert math.isnan(hc.sql_param_value("nan", False))
+    assert hc.sql_param_value("inf", False) == math.inf
+    assert hc.sql_param_value("abc", False) == "abc"
+    assert hc.sql_param_value("007", True) == "007"
+    assert hc.sql_param_value(None, False) is None
@@ -0,0 +1,36 @@
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import hypercard_engine as hc  # noqa: E402
+
+
+def fts_triggers(conn):
+    return sorted(r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+
+
+def test_failed_import_keeps_stack_and_search_triggers(tmp_path):
+    conn = sqlite3.connect(":memory:")
+    hc.init_db(conn)
+    before = fts_triggers(conn)
+    assert len(before) == 3
+
+    path = tmp_path / "bad.jsonl"
+    hc.export_stack(conn, str(path))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"kind": "bogus"}) + "\n")
+    with pytest.raises(ValueError):
+        hc.import_stack(conn, str(path))
+
+    assert fts_triggers(conn) == before
+    assert conn.execute("SELECT COUNT(*) FROM part").fetchone()[0] == 2
+    # the index still follows writes
+    with conn:
+        conn.execute("UPDATE part SET text = 'zebra crossing' WHERE name = 'Notes'")
+    model = hc.StackModel(conn)
+    assert model.find_card("zebra", None) == 1
@@ -0,0 +1,18 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import hypercard_engine as hc  # noqa: E402
+
+
+def test_flush_reports_whether_it_wrote():
+    conn = sqlite3.connect(":memory:")
+    hc.init_db(conn)
+    model = hc.StackModel(conn)
+    assert model.flush() is False
+    notes = model.find_part(model.card(1), "field", "Notes")
+    model.set_part_props(notes, text="edited")
+    assert model.flush() is True
+    assert model.flush() is False
@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import hypercard_engine as hc  # noqa: E402
+
+
+def run_job(pool, job):
+    done = threading.Event()
+    pool.submit(job, lambda j: done.set())
+    assert done.wait(10)
+    return job
+
+
+def test_open_result_does_not_block_writes(tmp_path):
+    path = str(tmp_path / "user.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t(a)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(5000)])
+    conn.commit()
+    conn.close()
+    pool = hc.UserSqlPool(path)
+    try:
+        browse = run_job(pool, hc.SqlJob("SELECT a FROM t", None))
+        assert browse.error is None
+        assert not browse.result.exhausted
+        insert = run_job(pool, hc.SqlJob("INSERT INTO t VALUES (1)", None, budget=2.0))
+        assert insert.error is None
+        pool.close_result(browse.result)
+    finally:
+        pool.shutdown()
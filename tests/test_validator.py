@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import hypercard_engine as hc  # noqa: E402
+
+CREATE_SCRIPT = 'on click\nsql "CREATE TABLE t(a)"\nend click'
+
+
+def make_old_stack(path, cards):
+    """a stack at schema version 0 whose every card has a button creating the same table"""
+    conn = sqlite3.connect(path)
+    conn.executescript(hc.SCHEMA_SQL)
+    with conn:
+        conn.execute("INSERT INTO stack (id, name, start_card_id, script) VALUES (1, 'S', 1, '')")
+        conn.execute("INSERT INTO background (id, stack_id, name, script, layout_json) VALUES (1, 1, 'BG', '', '{}')")
+        for i in range(1, cards + 1):
+            conn.execute("INSERT INTO card (id, stack_id, background_id, name, order_index, script) "
+                         "VALUES (?, 1, 1, ?, ?, '')", (i, f"Card {i}", i))
+            conn.execute("INSERT INTO part (card_id, type, name, props_json, script) VALUES (?, 'button', 'B', '{}', ?)",
+                         (i, CREATE_SCRIPT))
+    conn.close()
+
+
+def test_validate_leaves_the_stack_file_alone(tmp_path):
+    path = str(tmp_path / "old.db")
+    make_old_stack(path, 2)
+    with open(path, "rb") as f:
+        before = f.read()
+    assert hc.validate_main([path, "--scripts-only", "--workers", "1", "--user-db", str(tmp_path / "u.db")]) == 0
+    with open(path, "rb") as f:
+        assert f.read() == before
+    assert not os.path.exists(tmp_path / "u.db")
+
+
+def test_validate_missing_stack(tmp_path):
+    path = str(tmp_path / "nosuch.db")
+    with pytest.raises(SystemExit) as e:
+        hc.validate_main([path])
+    assert e.value.code == 2
+    assert not os.path.exists(path)
+
+
+def test_chunks_do_not_share_writes(tmp_path):
+    path = str(tmp_path / "s.db")
+    make_old_stack(path, 6)
+    user_db = str(tmp_path / "u.db")
+    reports = [hc.validate_stack(path, user_db, workers=w, chunk_cards=1) for w in (1, 3)]
+    for report in reports:
+        assert report["buttons"] == 6
+        assert report["clicks"] == []